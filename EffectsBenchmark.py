@@ -0,0 +1,405 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from GuitarEffectsCore import StreamingRenderer, create_processor, iter_blocks, process_file, write_audio
+
+BENCHMARK_FS = 44100
+DEFAULT_SECONDS = 10
+DEFAULT_REPEAT = 3
+DEFAULT_TOLERANCE = 0.2
+STARTUP_REPEAT = 5
+PIPELINE_SECONDS = 120
+PIPELINE_NORMALIZE = [None, "match_input"]
+# Per-block allocations of a few kB are noise; below this floor they are not
+# compared as ratios.
+PIPELINE_ALLOCATION_FLOOR_KB = 4
+PIPELINE_METRICS = ['allocated_kb_per_block', 'peak_memory_mb']
+BENCHMARK_BLOCK_SIZES = [1024, 8192, 44100]
+BENCHMARK_CHANNELS = [1, 2]
+
+# Each probe runs in a fresh interpreter, prints "ready" once it is done and
+# then the seconds it spent after the interpreter had started.
+STARTUP_PROBES = {
+    'core_import': "import GuitarEffectsCore",
+    'app_import': "import GuitarEffectsApp",
+    'first_window': "import GuitarEffectsApp\n"
+                    "root, app = GuitarEffectsApp.create_window()\n"
+                    "root.update()"
+}
+PROBE_TEMPLATE = """import time
+start = time.perf_counter()
+{code}
+print('ready', time.perf_counter() - start, flush=True)
+"""
+
+PRESETS = {
+    "Chorus": {
+        "light": {'rate_hz': 1.0, 'depth': 0.25, 'centre_delay_ms': 7.0, 'feedback': 0.0, 'mix': 0.5},
+        "heavy": {'rate_hz': 5.0, 'depth': 1.0, 'centre_delay_ms': 30.0, 'feedback': 0.7, 'mix': 1.0}
+    },
+    "Reverb": {
+        "room": {'room_size': 0.3, 'damping': 0.5, 'wet_level': 0.33, 'dry_level': 0.4, 'width': 1.0,
+                 'freeze_mode': 0.0},
+        "hall": {'room_size': 0.95, 'damping': 0.2, 'wet_level': 0.6, 'dry_level': 0.4, 'width': 1.0,
+                 'freeze_mode': 0.0}
+    },
+    "Distortion": {
+        "crunch": {'drive_db': 12.0},
+        "fuzz": {'drive_db': 45.0}
+    },
+    "Phaser": {
+        "slow": {'rate_hz': 0.5, 'depth': 0.5, 'centre_frequency_hz': 1300.0, 'feedback': 0.0, 'mix': 0.5},
+        "fast": {'rate_hz': 8.0, 'depth': 1.0, 'centre_frequency_hz': 600.0, 'feedback': 0.8, 'mix': 1.0}
+    },
+    "Delay": {
+        "slapback": {'delay_time': 0.08, 'decay': 0.3},
+        "long": {'delay_time': 2.0, 'decay': 0.5}
+    },
+    "Tremolo": {
+        "slow": {'rate_hz': 2.0, 'depth': 0.5},
+        "fast": {'rate_hz': 12.0, 'depth': 1.0}
+    },
+    "NoiseGate": {
+        "tight": {'threshold_db': -40.0, 'attack_ms': 0.5, 'release_ms': 30.0, 'floor_db': -80.0},
+        "soft": {'threshold_db': -60.0, 'attack_ms': 5.0, 'release_ms': 300.0, 'floor_db': -20.0}
+    },
+    "Compressor": {
+        "gentle": {'threshold_db': -18.0, 'ratio': 2.0, 'attack_ms': 20.0, 'release_ms': 200.0, 'makeup_db': 3.0},
+        "limit": {'threshold_db': -6.0, 'ratio': 20.0, 'attack_ms': 0.1, 'release_ms': 50.0, 'makeup_db': 0.0}
+    },
+    "TunedDelay": {
+        "eighth": {'bpm': 120.0, 'beats': 0.5, 'feedback': 0.4, 'mix': 0.35},
+        "dotted": {'bpm': 90.0, 'beats': 0.75, 'feedback': 0.8, 'mix': 0.5}
+    },
+    "Overdrive": {
+        "x1": {'drive_db': 20.0, 'level': 0.5, 'oversampling': 1.0},
+        "x4": {'drive_db': 20.0, 'level': 0.5, 'oversampling': 4.0}
+    }
+}
+
+
+def guitar_signal(seconds, fs=BENCHMARK_FS, channels=1, seed=0):
+    rng = np.random.default_rng(seed)
+    frames = int(seconds * fs)
+    signal = np.zeros(frames, dtype=np.float32)
+
+    note_length = int(0.5 * fs)
+    t = np.arange(note_length) / fs
+    envelope = np.exp(-4 * t)
+    for start in range(0, frames, note_length):
+        frequency = 82.41 * 2 ** (rng.integers(0, 36) / 12)
+        note = sum(np.sin(2 * np.pi * frequency * harmonic * t) / harmonic for harmonic in range(1, 7))
+        note = (0.3 * envelope * note).astype(np.float32)
+        length = min(note_length, frames - start)
+        signal[start:start + length] += note[:length]
+
+    signal += rng.normal(0, 1e-3, frames).astype(np.float32)
+    if channels == 1:
+        return signal.reshape(-1, 1)
+
+    # Slightly different channels so that stereo effects do real work.
+    return np.stack([np.roll(signal, channel * 37) for channel in range(channels)], axis=1)
+
+
+def render_once(effect, params, signal, fs, block_size):
+    renderer = StreamingRenderer(create_processor(effect, params, fs), fs, block_size=block_size,
+                                 flush_tail=False)
+    for _ in renderer.blocks(iter_blocks(signal, block_size)):
+        pass
+
+
+def run_case(effect, preset, params, signal, fs, block_size, repeat=DEFAULT_REPEAT):
+    timings = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        render_once(effect, params, signal, fs, block_size)
+        timings.append(time.perf_counter() - start_time)
+
+    tracemalloc.start()
+    render_once(effect, params, signal, fs, block_size)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    elapsed_time = min(timings)
+    seconds = len(signal) / fs
+    return {
+        'effect': effect,
+        'preset': preset,
+        'channels': signal.shape[1],
+        'block_size': block_size,
+        'seconds': seconds,
+        'elapsed_time': elapsed_time,
+        'realtime_factor': seconds / elapsed_time,
+        'samples_per_second': signal.size / elapsed_time,
+        'peak_memory_mb': peak_memory / 2 ** 20
+    }
+
+
+def run_benchmark(seconds=DEFAULT_SECONDS, fs=BENCHMARK_FS, effects=None, block_sizes=BENCHMARK_BLOCK_SIZES,
+                  channel_counts=BENCHMARK_CHANNELS, repeat=DEFAULT_REPEAT, report=None):
+    results = []
+    for channels in channel_counts:
+        signal = guitar_signal(seconds, fs, channels)
+        for effect in effects or list(PRESETS):
+            for preset, params in PRESETS[effect].items():
+                for block_size in block_sizes:
+                    result = run_case(effect, preset, params, signal, fs, block_size, repeat)
+                    results.append(result)
+                    if report is not None:
+                        report(result)
+    return results
+
+
+def run_probe(code):
+    start_time = time.perf_counter()
+    completed = subprocess.run([sys.executable, '-c', PROBE_TEMPLATE.format(code=code)], capture_output=True,
+                               text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    wall_time = time.perf_counter() - start_time
+    if completed.returncode != 0 or not completed.stdout.startswith('ready'):
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "brak wyniku")
+    return wall_time, float(completed.stdout.split()[1])
+
+
+def run_startup(repeat=STARTUP_REPEAT, report=None):
+    baseline_time = min(run_probe('pass')[0] for _ in range(repeat))
+    results = []
+    for name, code in STARTUP_PROBES.items():
+        try:
+            timings = [run_probe(code) for _ in range(repeat)]
+        except RuntimeError as e:
+            result = {'probe': name, 'error': str(e)}
+        else:
+            result = {
+                'probe': name,
+                'wall_time': min(wall_time for wall_time, _ in timings),
+                'interpreter_time': baseline_time,
+                'elapsed_time': min(elapsed_time for _, elapsed_time in timings)
+            }
+        results.append(result)
+        if report is not None:
+            report(result)
+    return results
+
+
+def compare_startup(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    baseline_results = {result['probe']: result for result in baseline.get('startup', []) if 'error' not in result}
+    regressions = []
+    for result in results:
+        reference = baseline_results.get(result['probe'])
+        if reference is None or 'error' in result:
+            continue
+        ratio = result['elapsed_time'] / reference['elapsed_time']
+        if ratio > 1 + tolerance:
+            regressions.append(dict(result, baseline_elapsed_time=reference['elapsed_time'], ratio=ratio))
+    return regressions
+
+
+def format_startup(result):
+    if 'error' in result:
+        return f"{result['probe']:<13} BŁĄD {result['error']}"
+    return (f"{result['probe']:<13} {result['elapsed_time'] * 1000:7.1f} ms w procesie, "
+            f"{result['wall_time'] * 1000:7.1f} ms od uruchomienia "
+            f"(sam interpreter {result['interpreter_time'] * 1000:.1f} ms)")
+
+
+class AllocationMeter:
+    # Used as the render progress callback, which runs once per block: the
+    # tracemalloc peak since the previous block, above the memory that was
+    # still in use then, is what producing this block allocated.
+    def __init__(self):
+        self.blocks = 0
+        self.total_bytes = 0
+        self.max_bytes = 0
+        self.peak_bytes = 0
+        self.collections = 0
+        self.mark = 0
+
+    def __enter__(self):
+        gc.callbacks.append(self.on_gc)
+        tracemalloc.start()
+        self.mark = tracemalloc.get_traced_memory()[0]
+        return self
+
+    def __exit__(self, *exc_info):
+        self(None)
+        tracemalloc.stop()
+        gc.callbacks.remove(self.on_gc)
+
+    def __call__(self, fraction):
+        current, peak = tracemalloc.get_traced_memory()
+        allocated = peak - self.mark
+        self.blocks += fraction is not None
+        self.total_bytes += allocated
+        self.max_bytes = max(self.max_bytes, allocated)
+        self.peak_bytes = max(self.peak_bytes, peak)
+        self.mark = current
+        tracemalloc.reset_peak()
+
+    def on_gc(self, phase, info):
+        if phase == 'start':
+            self.collections += 1
+
+
+def run_pipeline(seconds=PIPELINE_SECONDS, fs=BENCHMARK_FS, effects=None, block_size=BENCHMARK_BLOCK_SIZES[1],
+                 report=None):
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        input_path = os.path.join(folder, 'input.wav')
+        output_path = os.path.join(folder, 'output.wav')
+        write_audio(input_path, fs, guitar_signal(seconds, fs, channels=2))
+
+        for effect in effects or list(PRESETS):
+            preset, params = next(iter(PRESETS[effect].items()))
+            for normalize in PIPELINE_NORMALIZE:
+                start_time = time.perf_counter()
+                with AllocationMeter() as meter:
+                    process_file(input_path, [(effect, params)], output_path, block_size, progress=meter,
+                                 normalize=normalize)
+                elapsed_time = time.perf_counter() - start_time
+
+                result = {
+                    'effect': effect,
+                    'preset': preset,
+                    'normalize': normalize,
+                    'block_size': block_size,
+                    'seconds': seconds,
+                    'elapsed_time': elapsed_time,
+                    'blocks': meter.blocks,
+                    'allocated_kb_per_block': meter.total_bytes / max(meter.blocks, 1) / 2 ** 10,
+                    'max_allocated_kb': meter.max_bytes / 2 ** 10,
+                    'peak_memory_mb': meter.peak_bytes / 2 ** 20,
+                    'gc_collections': meter.collections
+                }
+                results.append(result)
+                if report is not None:
+                    report(result)
+    return results
+
+
+def format_pipeline(result):
+    return (f"{result['effect']:<10} normalizacja {str(result['normalize']):<11}: "
+            f"{result['allocated_kb_per_block']:8.1f} kB/blok (maks. {result['max_allocated_kb']:8.1f} kB), "
+            f"szczyt {result['peak_memory_mb']:6.1f} MB, {result['gc_collections']} GC, "
+            f"{result['elapsed_time']:.2f} s pod tracemalloc")
+
+
+def pipeline_key(result):
+    return result['effect'], result['preset'], result['normalize'], result['block_size']
+
+
+def compare_pipeline(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    baseline_results = {pipeline_key(result): result for result in baseline.get('pipeline', [])}
+    regressions = []
+    for result in results:
+        reference = baseline_results.get(pipeline_key(result))
+        if reference is None:
+            continue
+        for metric in PIPELINE_METRICS:
+            floor = PIPELINE_ALLOCATION_FLOOR_KB if metric == 'allocated_kb_per_block' else 0
+            ratio = max(result[metric], floor) / max(reference[metric], floor, 1e-12)
+            if ratio > 1 + tolerance:
+                regressions.append(dict(result, metric=metric, baseline_value=reference[metric], ratio=ratio))
+    return regressions
+
+
+def case_key(result):
+    return result['effect'], result['preset'], result['channels'], result['block_size']
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    baseline_results = {case_key(result): result for result in baseline.get('results', [])}
+    regressions = []
+    for result in results:
+        reference = baseline_results.get(case_key(result))
+        if reference is None:
+            continue
+        ratio = result['realtime_factor'] / reference['realtime_factor']
+        if ratio < 1 - tolerance:
+            regressions.append(dict(result, baseline_realtime_factor=reference['realtime_factor'], ratio=ratio))
+    return regressions
+
+
+def format_result(result):
+    return (f"{result['effect']:<10} {result['preset']:<8} {result['channels']} kan. blok {result['block_size']:>6}: "
+            f"{result['realtime_factor']:8.1f}x czasu rzeczywistego, "
+            f"{result['samples_per_second'] / 1e6:7.2f} Mpróbek/s, {result['peak_memory_mb']:6.1f} MB")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark efektów Guitar Effects App")
+    parser.add_argument('--seconds', type=float, default=DEFAULT_SECONDS)
+    parser.add_argument('--fs', type=int, default=BENCHMARK_FS)
+    parser.add_argument('--effects', nargs='+', choices=list(PRESETS), default=None)
+    parser.add_argument('--block-sizes', nargs='+', type=int, default=BENCHMARK_BLOCK_SIZES)
+    parser.add_argument('--channels', nargs='+', type=int, default=BENCHMARK_CHANNELS)
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--output', help="zapisz wyniki jako JSON")
+    parser.add_argument('--baseline', help="porównaj z zapisanymi wynikami JSON")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--pipeline', action='store_true',
+                        help="zmierz alokacje na blok przy przetwarzaniu pliku stereo zamiast efektów")
+    parser.add_argument('--startup', action='store_true',
+                        help="zmierz czas importu rdzenia i czas do pierwszego okna zamiast efektów")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    report = {
+        'python': sys.version.split()[0],
+        'platform': platform.platform()
+    }
+    if args.startup:
+        startup = run_startup(args.repeat, report=lambda result: print(format_startup(result)))
+        report['startup'] = startup
+        results = []
+    elif args.pipeline:
+        report['pipeline'] = run_pipeline(args.seconds, args.fs, args.effects, args.block_sizes[0],
+                                          report=lambda result: print(format_pipeline(result)))
+        results = []
+    else:
+        results = run_benchmark(args.seconds, args.fs, args.effects, args.block_sizes, args.channels, args.repeat,
+                                report=lambda result: print(format_result(result)))
+        report.update(seconds=args.seconds, fs=args.fs, results=results)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        if args.startup:
+            regressions = compare_startup(report['startup'], baseline, args.tolerance)
+            for regression in regressions:
+                print(f"REGRESJA: {format_startup(regression)} "
+                      f"(bazowo {regression['baseline_elapsed_time'] * 1000:.1f} ms, {regression['ratio']:.0%})")
+        elif args.pipeline:
+            regressions = compare_pipeline(report['pipeline'], baseline, args.tolerance)
+            for regression in regressions:
+                print(f"REGRESJA: {format_pipeline(regression)} "
+                      f"({regression['metric']} bazowo {regression['baseline_value']:.2f}, {regression['ratio']:.0%})")
+        else:
+            regressions = compare(results, baseline, args.tolerance)
+            for regression in regressions:
+                print(f"REGRESJA: {format_result(regression)} "
+                      f"(bazowo {regression['baseline_realtime_factor']:.1f}x, {regression['ratio']:.0%})")
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,41 +1,202 @@
 import tkinter as tk
 from tkinter import ttk
 from tkinter import messagebox
-from ttkthemes import ThemedTk
+from tkinter import filedialog
 import os
-from pedalboard import Pedalboard, Chorus, Reverb, Distortion, Phaser
-from pedalboard.io import AudioFile
-from scipy.io import wavfile
-import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import sounddevice as sd
-import soundfile as sf
 import time
+import threading
+import queue
 
-def delay_effect(chunk, fs, delay_time, decay):
+from GuitarEffectsCore import (BLOCK_EFFECTS, DEFAULT_BLOCK_SIZE, DEFAULT_LIVE_BLOCK_SIZE, EFFECT_PARAM_NAMES,
+                               EFFECT_PARAM_RANGES, OUTPUT_FOLDER,
+                               AudioReader, LibraryIndex, LiveMonitor, PlaybackEngine, Recorder, RenderCache, RenderCancelled,
+                               WaveformPyramid, build_parser, decode_cached, default_input_samplerate, profile_call,
+                               profile_report, read_audio, render_file, render_preview, run_command)
 
-    delay_samples = int(delay_time * fs)
+PLOT_STYLE = 'seaborn-v0_8'
+BLOCK_SIZES = [512, 1024, 2048, 4096, 8192, 16384, 32768]
+RENDER_POLL_MS = 50
+ZOOM_STEP = 0.8
+LIVE_BLOCK_SIZES = [32, 64, 128, 256, 512, 1024]
+LIVE_STATS_MS = 500
+PREVIEW_DEBOUNCE_MS = 60
+PREVIEW_SECONDS = 3
+PREVIEW_MAX_SECONDS = 10
 
-    delayed_chunk = np.zeros_like(chunk)
 
-    for i in range(len(chunk)):
-        if i - delay_samples < 0:
-            delayed_chunk[i] = chunk[i]
-        else:
-            delayed_chunk[i] = chunk[i] + decay * delayed_chunk[i - delay_samples]
-    
-    return delayed_chunk
+def load_pyplot():
+    # matplotlib is by far the slowest import, so it is loaded together with
+    # the first figure instead of at startup.
+    import matplotlib.pyplot as plt
+
+    plt.style.use(PLOT_STYLE)
+    return plt
+
+
+def create_figure(master, rows=1, figsize=(5, 3)):
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+    figure, axes = load_pyplot().subplots(rows, 1, figsize=figsize, tight_layout=True)
+    return figure, axes, FigureCanvasTkAgg(figure, master=master)
+
+
+class WaveformView:
+    def __init__(self, master, x, y, title, on_seek=None):
+        self.master = master
+        self.x = x
+        self.y = y
+        self.ax = None
+        self.canvas = None
+        self.title = title
+        self.on_seek = on_seek
+        self.layers = []
+        self.artists = []
+        self.start = 0.0
+        self.end = 0.0
+        self.updating = False
+
+    def create(self):
+        _, self.ax, self.canvas = create_figure(self.master)
+        self.canvas.get_tk_widget().place(x=self.x, y=self.y)
+        self.canvas.mpl_connect('scroll_event', self.on_scroll)
+        self.canvas.mpl_connect('button_press_event', self.on_click)
+
+    def clear(self):
+        if self.ax is None:
+            return
+        self.layers = []
+        self.artists = []
+        self.ax.clear()
+        self.canvas.draw_idle()
+
+    def show(self, layers, legend_handles=None):
+        if self.ax is None:
+            self.create()
+        self.layers = layers
+        self.artists = []
+
+        self.ax.clear()
+        self.ax.set_title(self.title)
+        self.ax.set_xlabel('Czas (s)')
+        self.ax.set_ylabel('Amplituda')
+        self.ax.grid(True)
+        self.ax.callbacks.connect('xlim_changed', self.on_xlim_changed)
+
+        self.start = min(pyramid.offset for pyramid, _ in layers)
+        self.end = max(pyramid.end for pyramid, _ in layers)
+        low = min(pyramid.peak_range()[0] for pyramid, _ in layers)
+        high = max(pyramid.peak_range()[1] for pyramid, _ in layers)
+        margin = (high - low) * 0.05 or 1
+
+        self.updating = True
+        self.ax.set_xlim(self.start, self.end if self.end > self.start else self.start + 1)
+        self.ax.set_ylim(low - margin, high + margin)
+        self.updating = False
+
+        self.draw_envelopes()
+        if legend_handles:
+            self.ax.legend(handles=legend_handles, loc='lower left')
+        self.canvas.draw_idle()
+
+    def draw_envelopes(self):
+        for artist in self.artists:
+            artist.remove()
+        self.artists = []
+
+        start, end = self.ax.get_xlim()
+        pixels = self.ax.get_window_extent().width
+        for pyramid, color in self.layers:
+            times, mins, maxs = pyramid.envelope(start, end, pixels)
+            for channel in range(pyramid.channels):
+                self.artists.append(self.ax.fill_between(times, mins[:, channel], maxs[:, channel], step='post',
+                                                         color=color, linewidth=0.5))
+
+    def on_xlim_changed(self, ax):
+        if not self.updating and self.layers:
+            self.draw_envelopes()
+            self.canvas.draw_idle()
+
+    def on_scroll(self, event):
+        if event.inaxes is not self.ax or not self.layers:
+            return
+
+        start, end = self.ax.get_xlim()
+        factor = ZOOM_STEP if event.button == 'up' else 1 / ZOOM_STEP
+        width = min(max((end - start) * factor, 1 / self.layers[0][0].fs * 16), self.end - self.start)
+        centre = event.xdata
+        start = centre - (centre - start) * width / (end - start)
+        start = min(max(start, self.start), self.end - width)
+        self.ax.set_xlim(start, start + width)
+
+    def on_click(self, event):
+        if event.inaxes is not self.ax or not self.layers:
+            return
+        if event.dblclick:
+            self.ax.set_xlim(self.start, self.end)
+        elif event.button == 1 and self.on_seek is not None:
+            self.on_seek(event.xdata)
+
+    def visible_region(self):
+        if not self.layers:
+            return None
+        start, end = self.ax.get_xlim()
+        if start <= self.start and end >= self.end:
+            return None
+        return max(start, self.start), min(end, self.end)
+
 
 class GuitarEffectsApp:
-    def __init__(self, master):
+    def __init__(self, master, server=None):
         self.master = master
         self.master.title("Guitar Effects App")
 
         self.effect_var = tk.StringVar()
         self.file_path_var = tk.StringVar()
+        self.file_choice_var = tk.StringVar()
+        self.block_size_var = tk.StringVar(value=str(DEFAULT_BLOCK_SIZE))
+        self.normalize_var = tk.BooleanVar(value=True)
         self.recording_index = 1
         self.is_recording = False
+        self.recorder = None
+
+        self.live_monitor = None
+        self.live_block_size_var = tk.StringVar(value=str(DEFAULT_LIVE_BLOCK_SIZE))
+
+        self.render_cache = RenderCache()
+        self.library = LibraryIndex()
+        self.library_paths = {}
+        self.library_queue = queue.Queue()
+        self.library_thread = None
+        self.library_rescan = False
+        self.chain = []
+
+        self.preview_var = tk.BooleanVar(value=False)
+        self.preview_after = None
+        self.preview_thread = None
+        self.preview_pending = False
+        self.preview_requested = 0.0
+        self.preview_source = None
+        self.preview_queue = queue.Queue()
+
+        self.playback = None
+        self.loop_var = tk.BooleanVar(value=False)
+        self.processed_result = None
+        self.spectrum_window = None
+        self.stats_window = None
+        self.profile_var = tk.BooleanVar(value=False)
+        self.render_ui_time = 0.0
+
+        # With a render server configured, renders are submitted to it as
+        # jobs instead of running in this process.
+        self.render_client = None
+        if server is not None:
+            from RenderServer import RenderClient
+
+            self.render_client = RenderClient(server)
+
+        self.render_queue = queue.Queue()
+        self.render_thread = None
+        self.render_cancel = None
 
         self.effect_var.trace_add('write', self.on_effect_change)
         self.param_labels = []
@@ -47,14 +208,17 @@ class GuitarEffectsApp:
 
     def create_widgets(self):
         file_label = ttk.Label(self.master, text="Wybierz plik dźwiękowy:")
-        self.file_list = ttk.Combobox(self.master, textvariable=self.file_path_var, state='readonly')
+        self.file_list = ttk.Combobox(self.master, textvariable=self.file_choice_var, state='readonly', width=16)
+        self.file_list.bind('<<ComboboxSelected>>', lambda event: self.on_browse())
+        add_folder_button = ttk.Button(self.master, text="Folder...", command=self.add_library_folder)
         self.populate_file_list()
 
         file_label.place(x=25,y=40)
         self.file_list.place(x=180,y=35)
+        add_folder_button.place(x=320, y=33, width=80)
 
         effect_label = ttk.Label(self.master, text="Wybierz efekt:")
-        effect_combo = ttk.Combobox(self.master, textvariable=self.effect_var, values=["Chorus", "Reverb", "Distortion", "Phaser", "Delay"])
+        effect_combo = ttk.Combobox(self.master, textvariable=self.effect_var, values=list(EFFECT_PARAM_NAMES))
         apply_button = ttk.Button(self.master, text="Zastosuj efekt", command=self.apply_effect)
 
         effect_label.place(x=25,y=100)
@@ -68,6 +232,8 @@ class GuitarEffectsApp:
             "Phaser": self.create_phaser_params,
             "Delay": self.create_delay_params
         }
+        for effect in BLOCK_EFFECTS:
+            self.param_creators[effect] = lambda effect=effect: self.create_block_effect_params(effect)
 
         self.create_params_for_effect()
 
@@ -77,6 +243,52 @@ class GuitarEffectsApp:
         self.record_button.place(x=25, y=160)
         self.stop_button.place(x=220, y=160)
 
+        block_size_label = ttk.Label(self.master, text="Rozmiar bloku:")
+        block_size_combo = ttk.Combobox(self.master, textvariable=self.block_size_var,
+                                        values=BLOCK_SIZES, state='readonly', width=10)
+
+        block_size_label.place(x=25, y=215)
+        block_size_combo.place(x=140, y=210)
+
+        normalize_check = ttk.Checkbutton(self.master, text="Normalizuj", variable=self.normalize_var)
+        normalize_check.place(x=270, y=212)
+
+        self.live_button = ttk.Button(self.master, text="Monitoring na żywo", command=self.toggle_live_monitor)
+        live_block_size_combo = ttk.Combobox(self.master, textvariable=self.live_block_size_var,
+                                             values=LIVE_BLOCK_SIZES, state='readonly', width=6)
+        self.live_stats_label = ttk.Label(self.master, text="")
+
+        preview_check = ttk.Checkbutton(self.master, text="Podgląd", variable=self.preview_var,
+                                        command=self.on_preview_toggle)
+        self.preview_label = ttk.Label(self.master, text="")
+
+        preview_check.place(x=25, y=600)
+        self.preview_label.place(x=120, y=602)
+
+        self.live_button.place(x=25, y=520)
+        live_block_size_combo.place(x=190, y=522)
+        self.live_stats_label.place(x=25, y=560)
+
+        chain_label = ttk.Label(self.master, text="Łańcuch efektów:")
+        self.chain_list = tk.Listbox(self.master, width=36, height=8, exportselection=False)
+        add_stage_button = ttk.Button(self.master, text="Dodaj", command=self.add_chain_stage)
+        update_stage_button = ttk.Button(self.master, text="Zmień", command=self.update_chain_stage)
+        remove_stage_button = ttk.Button(self.master, text="Usuń", command=self.remove_chain_stage)
+        clear_chain_button = ttk.Button(self.master, text="Wyczyść", command=self.clear_chain)
+
+        chain_label.place(x=430, y=370)
+        self.chain_list.place(x=430, y=395)
+        add_stage_button.place(x=430, y=560, width=115)
+        update_stage_button.place(x=550, y=560, width=115)
+        remove_stage_button.place(x=430, y=595, width=115)
+        clear_chain_button.place(x=550, y=595, width=115)
+
+        stats_button = ttk.Button(self.master, text="Statystyki", command=self.show_stats)
+        profile_check = ttk.Checkbutton(self.master, text="cProfile", variable=self.profile_var)
+
+        stats_button.place(x=430, y=630, width=115)
+        profile_check.place(x=555, y=634)
+
         play_original_button = ttk.Button(self.master, text="Odtwórz oryginał", command=self.play_original)
         play_processed_button = ttk.Button(self.master, text="Odtwórz przetworzone", command=self.play_processed)
 
@@ -89,33 +301,77 @@ class GuitarEffectsApp:
         self.stop_original_button.place(x=690, y=320)
         self.stop_processed_button.place(x=1220, y=320)
 
+        loop_check = ttk.Checkbutton(self.master, text="Pętla", variable=self.loop_var, command=self.on_loop_toggle)
+        loop_check.place(x=820, y=324)
 
-        self.fig_original, self.ax_original = plt.subplots(figsize=(5, 3), tight_layout=True)
-        self.canvas_original = FigureCanvasTkAgg(self.fig_original, master=self.master)
-        self.canvas_widget_original = self.canvas_original.get_tk_widget()
-        self.canvas_widget_original.place(x=420, y=10)
+        spectrum_button = ttk.Button(self.master, text="Widmo", command=self.show_spectrum)
+        spectrum_button.place(x=890, y=320)
 
-        self.fig, self.ax = plt.subplots(figsize=(5, 3), tight_layout=True)
-        self.canvas = FigureCanvasTkAgg(self.fig, master=self.master)
-        self.canvas_widget = self.canvas.get_tk_widget()
-        self.canvas_widget.place(x=940, y=10)
 
-        self.fig_combined, self.ax_combined = plt.subplots(figsize=(5, 3), tight_layout=True)
-        self.canvas_combined = FigureCanvasTkAgg(self.fig_combined, master=self.master)
-        self.canvas_widget_combined = self.canvas_combined.get_tk_widget()
-        self.canvas_widget_combined.place(x=670, y=370)
-        self.processed_handle = plt.Line2D([], [], color='blue', label='Przetworzony')
-        self.original_handle = plt.Line2D([], [], color='orange', label='Oryginalny')
-        
+        self.original_view = WaveformView(self.master, 420, 10, 'Oryginalny', self.seek_playback)
+        self.processed_view = WaveformView(self.master, 940, 10, 'Przetworzony', self.seek_playback)
+        self.combined_view = WaveformView(self.master, 670, 370, 'Połączone wykresy', self.seek_playback)
+
+    def library_folders(self):
+        # Added folders are scanned with their subfolders; the working
+        # directory is always in the library, but only its own files.
+        return self.library.folders(), [os.getcwd()]
 
     def populate_file_list(self):
-        files = os.listdir()
-        audio_files = [file for file in files if file.endswith((".wav", ".mp3"))]
-        self.file_list['values'] = audio_files
+        # The list comes straight from the index; the folders are rescanned in
+        # the background and the list is refreshed when that finishes.
+        self.refresh_file_list()
+        if self.library_thread is not None:
+            self.library_rescan = True
+            return
+
+        self.library_thread = threading.Thread(target=self.library_worker, args=self.library_folders(),
+                                               daemon=True)
+        self.library_thread.start()
+        self.master.after(RENDER_POLL_MS, self.poll_library_queue)
+
+    def refresh_file_list(self):
+        self.library_paths = {}
+        for info in self.library.files(*self.library_folders()):
+            minutes, seconds = divmod(info['duration'], 60)
+            label = (f"{os.path.relpath(info['path'])} ({int(minutes)}:{seconds:04.1f}, {info['fs'] / 1000:g} kHz, "
+                     f"{info['channels']} kan., {info['peak_db']:.1f} dBFS)")
+            self.library_paths[label] = info['path']
+        self.file_list['values'] = list(self.library_paths)
+
+    def library_worker(self, folders, shallow):
+        try:
+            self.library_queue.put(('done', self.library.scan(folders, shallow=shallow)))
+        except Exception as e:
+            self.library_queue.put(('error', str(e)))
+
+    def poll_library_queue(self):
+        try:
+            kind, value = self.library_queue.get_nowait()
+        except queue.Empty:
+            self.master.after(RENDER_POLL_MS, self.poll_library_queue)
+            return
+
+        self.library_thread = None
+        if kind == 'done' and value:
+            self.refresh_file_list()
+        if self.library_rescan:
+            self.library_rescan = False
+            self.populate_file_list()
+
+    def add_library_folder(self):
+        folder = filedialog.askdirectory(title="Dodaj folder do biblioteki")
+        if folder:
+            self.library.add_folder(folder)
+            self.populate_file_list()
 
     def on_browse(self):
-        selected_file = self.file_list.get()
-        self.file_path_var.set(selected_file)
+        file_path = self.library_paths.get(self.file_list.get(), '')
+        self.file_path_var.set(file_path)
+
+        pyramid = self.library.thumbnail(file_path) if file_path else None
+        if pyramid is not None:
+            self.plot_original(pyramid)
 
     def create_params_for_effect(self):
         selected_effect = self.effect_var.get()
@@ -144,6 +400,106 @@ class GuitarEffectsApp:
     def on_effect_change(self, *args):
         self.clear_param_widgets()
         self.create_params_for_effect()
+        self.on_param_change()
+
+    def on_param_change(self):
+        if self.live_monitor is not None:
+            self.live_monitor.update(self.effect_var.get(), self.get_effect_params())
+        if self.preview_var.get():
+            self.schedule_preview()
+
+    def on_preview_toggle(self):
+        if self.preview_var.get():
+            self.schedule_preview()
+        else:
+            if self.preview_after is not None:
+                self.master.after_cancel(self.preview_after)
+                self.preview_after = None
+            if self.playback is not None:
+                self.playback.pause()
+                self.playback.remove_source('preview')
+                self.on_loop_toggle()
+            self.preview_label.config(text="")
+
+    def schedule_preview(self):
+        if self.preview_after is not None:
+            self.master.after_cancel(self.preview_after)
+        self.preview_requested = time.perf_counter()
+        self.preview_after = self.master.after(PREVIEW_DEBOUNCE_MS, self.start_preview)
+
+    def preview_region(self):
+        region = self.original_view.visible_region()
+        if region is None:
+            return 0.0, float(PREVIEW_SECONDS)
+        start, end = region
+        return start, min(end, start + PREVIEW_MAX_SECONDS)
+
+    def preview_chain(self):
+        current = (self.effect_var.get(), self.get_effect_params())
+        if not self.chain:
+            return [current]
+        chain = list(self.chain)
+        selection = self.chain_list.curselection()
+        if selection and current[0] in EFFECT_PARAM_NAMES:
+            chain[selection[0]] = current
+        return chain
+
+    def start_preview(self):
+        self.preview_after = None
+        file_path = self.file_path_var.get()
+        if not file_path or not self.preview_var.get():
+            return
+        if self.preview_thread is not None:
+            self.preview_pending = True
+            return
+
+        self.preview_thread = threading.Thread(
+            target=self.preview_worker,
+            args=(file_path, self.preview_region(), self.preview_chain(), self.preview_requested),
+            daemon=True)
+        self.preview_thread.start()
+        self.master.after(RENDER_POLL_MS // 5, self.poll_preview_queue)
+
+    def load_preview_source(self, file_path, region):
+        if self.preview_source is not None and self.preview_source[:2] == (file_path, region):
+            return self.preview_source[2:]
+
+        with AudioReader(file_path) as reader:
+            start_frame = int(region[0] * reader.fs)
+            audio = reader.read_region(start_frame, int((region[1] - region[0]) * reader.fs))
+            fs = reader.fs
+
+        self.preview_source = (file_path, region, fs, audio)
+        return fs, audio
+
+    def preview_worker(self, file_path, region, chain, requested):
+        try:
+            fs, audio = self.load_preview_source(file_path, region)
+            processed = render_preview(audio, fs, chain)
+            self.preview_queue.put(('done', fs, processed, region, requested))
+        except Exception as e:
+            self.preview_queue.put(('error', e))
+
+    def poll_preview_queue(self):
+        try:
+            message = self.preview_queue.get_nowait()
+        except queue.Empty:
+            self.master.after(RENDER_POLL_MS // 5, self.poll_preview_queue)
+            return
+
+        self.preview_thread = None
+        if message[0] == 'done' and self.preview_var.get():
+            _, fs, processed, region, requested = message
+            self.play_preview(fs, processed, region)
+            latency = (time.perf_counter() - requested) * 1000
+            self.preview_label.config(text=f"{region[0]:.1f}-{region[1]:.1f} s, {latency:.0f} ms")
+            self.processed_view.show([(WaveformPyramid.from_signal(processed, fs, offset=region[0]), 'blue')])
+        elif message[0] == 'error':
+            self.preview_label.config(text=f"Błąd podglądu: {message[1]}")
+
+        if self.preview_pending:
+            self.preview_pending = False
+            self.start_preview()
 
     def create_chorus_params(self):
         if hasattr(self, 'scale_value_labels'):
@@ -175,6 +531,7 @@ class GuitarEffectsApp:
 
             def update_scale_value(value, label):
                 label.config(text=value)
+                self.on_param_change()
 
             param_scale.config(command=lambda value, label=scale_value_label: update_scale_value(round(float(value), 2), label))
             update_scale_value(scale_range[0], scale_value_label)
@@ -212,6 +569,7 @@ class GuitarEffectsApp:
 
             def update_scale_value(value, label):
                 label.config(text=value)
+                self.on_param_change()
 
             param_scale.config(command=lambda value, label=scale_value_label: update_scale_value(round(float(value), 2), label))
             update_scale_value(scale_range[0], scale_value_label)
@@ -248,6 +606,7 @@ class GuitarEffectsApp:
 
             def update_scale_value(value, label):
                 label.config(text=value)
+                self.on_param_change()
 
             param_scale.config(command=lambda value, label=scale_value_label: update_scale_value(round(float(value), 2), label))
             update_scale_value(scale_range[0], scale_value_label)
@@ -284,6 +643,7 @@ class GuitarEffectsApp:
 
             def update_scale_value(value, label):
                 label.config(text=value)
+                self.on_param_change()
 
             param_scale.config(command=lambda value, label=scale_value_label: update_scale_value(round(float(value), 2), label))
             update_scale_value(scale_range[0], scale_value_label)
@@ -320,202 +680,430 @@ class GuitarEffectsApp:
 
             def update_scale_value(value, label):
                 label.config(text=value)
+                self.on_param_change()
 
             param_scale.config(command=lambda value, label=scale_value_label: update_scale_value(round(float(value), 2), label))
             update_scale_value(scale_range[0], scale_value_label)
 
         return self.scale_value_labels
 
+    def create_block_effect_params(self, effect):
+        # The NumPy effects share one layout, driven by their parameter ranges,
+        # and start from the effect's defaults rather than the range minimum.
+        self.clear_param_widgets()
+        y_offset = 265
+
+        for i, name in enumerate(EFFECT_PARAM_NAMES[effect]):
+            scale_range = EFFECT_PARAM_RANGES[effect][name]
+            default = round(BLOCK_EFFECTS[effect].defaults[name], 2)
+
+            param_label = ttk.Label(self.master, text=name)
+            param_label.place(x=15, y=y_offset + 40 * i)
+
+            param_scale = ttk.Scale(self.master, from_=scale_range[0], to=scale_range[1], length=200,
+                                    orient=tk.HORIZONTAL, style="Horizontal.TScale")
+            param_scale.place(x=190, y=y_offset + 40 * i)
+            param_scale.set(default)
+
+            self.param_labels.append(param_label)
+            self.param_entries.append(param_scale)
+
+            scale_value_label = ttk.Label(self.master, text=default)
+            scale_value_label.place(x=390, y=y_offset + 40 * i)
+            self.scale_value_labels.append(scale_value_label)
+
+            def update_scale_value(value, label):
+                label.config(text=value)
+                self.on_param_change()
+
+            param_scale.config(command=lambda value, label=scale_value_label: update_scale_value(round(float(value), 2), label))
+
+        return self.scale_value_labels
+
     def start_recording(self):
         if not self.is_recording:
+            samplerate = default_input_samplerate()
+            recording_path = f"Recording{self.recording_index}.wav"
+            try:
+                self.recorder = Recorder(recording_path, samplerate)
+                self.recorder.start()
+            except Exception as e:
+                tk.messagebox.showerror("Błąd", f"Nie udało się rozpocząć nagrywania: {e}")
+                return
+
             self.is_recording = True
             self.stop_button.config(state=tk.NORMAL)
             self.record_button.config(state=tk.DISABLED)
 
-            self.recording_data = []
-            self.samplerate = sd.query_devices(None, 'input')['default_samplerate']
-            self.recording_stream = sd.InputStream(callback=self.record_callback, samplerate=self.samplerate)
-            self.recording_stream.start()
-
-
-    def record_callback(self, indata, frames, time, status):
-        if status:
-            print(status)
-        if self.is_recording:
-            self.recording_data.append(indata.copy())
-
     def stop_recording(self):
         self.is_recording = False
-        self.recording_stream.stop()
+        self.recorder.stop()
         self.stop_button.config(state=tk.DISABLED)
         self.record_button.config(state=tk.NORMAL)
 
-        recording_array = np.vstack(self.recording_data)
-        recording_path = f"Recording{self.recording_index}.wav"
-        wavfile.write(recording_path, int(self.samplerate), recording_array)
-        
+        recording_path = self.recorder.path
+
         recording_info_path = f"Recording{self.recording_index}_info.txt"
         with open(recording_info_path, "w") as info_file:
-            info_file.write(f"Length: {len(self.recording_data) / self.samplerate} seconds")
+            info_file.write(f"Length: {self.recorder.duration} seconds\n")
+            info_file.write(f"Dropped frames: {self.recorder.dropped_frames}\n")
 
         self.recording_index += 1
-        messagebox.showinfo("Nagranie zakończone", f"Nagranie zostało zapisane jako {recording_path}")
+        message = f"Nagranie zostało zapisane jako {recording_path}"
+        if self.recorder.dropped_frames:
+            message += f"\nUtracone próbki: {self.recorder.dropped_frames}"
+        messagebox.showinfo("Nagranie zakończone", message)
 
-        self.recording_data.clear()
+        self.recorder = None
 
         self.populate_file_list()
 
-    def apply_effect(self):
-        file_path = self.file_path_var.get()
-        if not file_path:
-            tk.messagebox.showwarning("Brak pliku", "Proszę wybrać plik dźwiękowy.")
+    def toggle_live_monitor(self):
+        if self.live_monitor is not None:
+            self.live_monitor.stop()
+            self.live_monitor = None
+            self.live_button.config(text="Monitoring na żywo")
+            self.live_stats_label.config(text="")
             return
 
         try:
-            self.ax.clear()
-            self.canvas.draw()
-
-            self.progress_label = ttk.Label(self.master, text="Postęp:")
-            self.progress_var = tk.DoubleVar()
-            self.progress_bar = ttk.Progressbar(self.master, orient="horizontal", mode="determinate", variable=self.progress_var)
-            
-            self.progress_label.place(x=50,y=655)
-            self.progress_bar.place(x=30,y=675)
-
-            fs_original, signal_original = wavfile.read(file_path)
-            max_amplitude_original = np.max(np.abs(signal_original))
-
-            self.ax_original.clear()
-            self.ax_original.plot(np.arange(len(signal_original)) / fs_original, signal_original, color='orange', linewidth=0.5)
-            self.ax_original.set_title('Oryginalny')
-            self.ax_original.set_xlabel('Czas (s)')
-            self.ax_original.set_ylabel('Amplituda')
-            self.ax_original.grid(True)
-            self.canvas_original.draw()
-
-            selected_effect = self.effect_var.get()
-            if selected_effect == "Chorus":
-                chorus_param = {
-                    'rate_hz': float(self.param_entries[0].get()),
-                    'depth': float(self.param_entries[1].get()),
-                    'centre_delay_ms': float(self.param_entries[2].get()),
-                    'feedback': float(self.param_entries[3].get()),
-                    'mix': float(self.param_entries[4].get())
-                }
-                chorus = Chorus(**chorus_param)
-                board = Pedalboard([chorus])
-
-            elif selected_effect == "Reverb":
-                reverb_param = {
-                    'room_size': float(self.param_entries[0].get()),
-                    'damping': float(self.param_entries[1].get()),
-                    'wet_level': float(self.param_entries[2].get()),
-                    'dry_level': float(self.param_entries[3].get()),
-                    'width': float(self.param_entries[4].get()),
-                    'freeze_mode': float(self.param_entries[5].get())
-                }
-                reverb = Reverb(**reverb_param)
-                board = Pedalboard([reverb])
-
-            elif selected_effect == "Distortion":
-                distortion_param = {
-                    'drive_db': float(self.param_entries[0].get()),
-                }
-                distortion = Distortion(**distortion_param)
-                board = Pedalboard([distortion])
-
-
-            elif selected_effect == "Phaser":
-                phaser_param = {
-                    'rate_hz': float(self.param_entries[0].get()),
-                    'depth': float(self.param_entries[1].get()),
-                    'centre_frequency_hz': float(self.param_entries[2].get()),
-                    'feedback': float(self.param_entries[3].get()),
-                    'mix': float(self.param_entries[4].get())
-                }
-                phaser = Phaser(**phaser_param)
-                board = Pedalboard([phaser])
-
-            elif selected_effect == "Delay":
-                delay_time_s = float(self.param_entries[0].get())
-                decay = float(self.param_entries[1].get())
-                mono_signal = signal_original[:, 0]
-
-                processed_signal = delay_effect(mono_signal, fs_original, delay_time_s, decay)
+            fs = int(default_input_samplerate())
+            self.live_monitor = LiveMonitor(self.effect_var.get(), self.get_effect_params(), fs,
+                                            block_size=int(self.live_block_size_var.get()))
+            self.live_monitor.start()
+        except Exception as e:
+            self.live_monitor = None
+            tk.messagebox.showerror("Błąd", f"Nie udało się uruchomić monitoringu: {e}")
+            return
 
-    
-            else:
-                board = Pedalboard([])
+        self.live_button.config(text="Zatrzymaj monitoring")
+        self.master.after(LIVE_STATS_MS, self.update_live_stats)
 
-            output_folder = os.path.join(os.path.dirname(__file__), 'processed output')
-            os.makedirs(output_folder, exist_ok=True)
-            output_path = os.path.join(output_folder, 'output.wav')
+    def update_live_stats(self):
+        if self.live_monitor is None:
+            return
 
+        stats = self.live_monitor.stats()
+        self.live_stats_label.config(
+            text=f"Opóźnienie: {stats['round_trip_ms']:.1f} ms, xruny: {stats['xruns']}, "
+                 f"spóźnione bloki: {stats['late_callbacks']}, maks. callback: {stats['max_callback_ms']:.2f} ms")
+        self.master.after(LIVE_STATS_MS, self.update_live_stats)
+
+    def get_effect_params(self):
+        param_names = EFFECT_PARAM_NAMES.get(self.effect_var.get(), [])
+        return {name: float(entry.get()) for name, entry in zip(param_names, self.param_entries)}
+
+    def get_render_chain(self):
+        if self.chain:
+            return list(self.chain)
+        return [(self.effect_var.get(), self.get_effect_params())]
+
+    def format_stage(self, effect, params):
+        values = ", ".join(f"{name}={value:.2f}" for name, value in params.items())
+        return f"{effect} ({values})" if values else effect
+
+    def refresh_chain_list(self):
+        self.chain_list.delete(0, tk.END)
+        for index, (effect, params) in enumerate(self.chain, start=1):
+            self.chain_list.insert(tk.END, f"{index}. {self.format_stage(effect, params)}")
+
+    def add_chain_stage(self):
+        if self.effect_var.get() not in EFFECT_PARAM_NAMES:
+            tk.messagebox.showwarning("Brak efektu", "Proszę wybrać efekt.")
+            return
+        self.chain.append((self.effect_var.get(), self.get_effect_params()))
+        self.refresh_chain_list()
 
+    def update_chain_stage(self):
+        selection = self.chain_list.curselection()
+        if not selection or self.effect_var.get() not in EFFECT_PARAM_NAMES:
+            tk.messagebox.showwarning("Brak etapu", "Proszę wybrać etap łańcucha i efekt.")
+            return
+        self.chain[selection[0]] = (self.effect_var.get(), self.get_effect_params())
+        self.refresh_chain_list()
+        self.chain_list.selection_set(selection[0])
 
-            start_time = time.time()
+    def remove_chain_stage(self):
+        selection = self.chain_list.curselection()
+        index = selection[0] if selection else len(self.chain) - 1
+        if index >= 0:
+            del self.chain[index]
+            self.refresh_chain_list()
 
-            if selected_effect == "Delay":
-                with AudioFile(output_path, 'w', fs_original, 1) as o:
-                    for i in range(0, len(processed_signal), fs_original):
-                        chunk = processed_signal[i:i+fs_original]
-                        o.write(chunk)
+    def clear_chain(self):
+        self.chain.clear()
+        self.refresh_chain_list()
 
-                        self.progress_var.set((i + fs_original) / len(processed_signal) * 100)
-                        self.master.update_idletasks()
+    def apply_effect(self):
+        if self.render_thread is not None:
+            messagebox.showwarning("Trwa przetwarzanie", "Poczekaj na zakończenie przetwarzania lub je anuluj.")
+            return
 
-            else:
+        file_path = self.file_path_var.get()
+        if not file_path:
+            tk.messagebox.showwarning("Brak pliku", "Proszę wybrać plik dźwiękowy.")
+            return
 
-                with AudioFile(output_path, 'w', fs_original, signal_original.shape[1]) as o:
-                    for i in range(0, len(signal_original), fs_original):
-                        chunk = signal_original[i:i+fs_original]
+        self.processed_view.clear()
 
-                        effected_chunk = np.array([board(chunk[:, j], fs_original) for j in range(chunk.shape[1])])
-                        o.write(effected_chunk.T)
+        self.progress_label = ttk.Label(self.master, text="Postęp:")
+        self.progress_var = tk.DoubleVar()
+        self.progress_bar = ttk.Progressbar(self.master, orient="horizontal", mode="determinate", variable=self.progress_var)
+        self.cancel_button = ttk.Button(self.master, text="Anuluj", command=self.cancel_render)
 
-                        self.progress_var.set((i + fs_original) / len(signal_original) * 100)
-                        self.master.update_idletasks()
+        self.progress_label.place(x=50,y=655)
+        self.progress_bar.place(x=30,y=675)
+        self.cancel_button.place(x=150, y=668)
 
-            end_time = time.time()
-            elapsed_time = end_time - start_time
+        os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+        output_path = os.path.join(OUTPUT_FOLDER, 'output.wav')
 
-            fs, signal = wavfile.read(output_path)
+        # Profiling is a one-shot switch, it only applies to the next render.
+        profile_path = os.path.join(OUTPUT_FOLDER, 'render.prof') if self.profile_var.get() else None
+        self.profile_var.set(False)
 
-            max_amplitude_processed = np.max(np.abs(signal))
+        self.render_ui_time = 0.0
+        self.render_cancel = threading.Event()
+        self.render_thread = threading.Thread(
+            target=self.render_worker,
+            args=(file_path, self.get_render_chain(), output_path,
+                  int(self.block_size_var.get()), "match_input" if self.normalize_var.get() else None,
+                  self.render_cancel, profile_path),
+            daemon=True)
+        self.render_thread.start()
 
-            scaling_factor = max_amplitude_original / max_amplitude_processed
+        self.master.after(RENDER_POLL_MS, self.poll_render_queue)
 
-            normalized_signal = scaling_factor * signal
+    def render_worker(self, file_path, chain, output_path, block_size, normalize, cancel, profile_path=None):
+        try:
+            render = render_file if self.render_client is None else self.render_client.render_file
+            args = (file_path, chain, output_path, block_size)
+            kwargs = dict(progress=lambda fraction: self.render_queue.put(('progress', fraction)),
+                          cancel=cancel, normalize=normalize, cache=self.render_cache)
+            if profile_path is None:
+                result = render(*args, **kwargs)
+            else:
+                result = profile_call(profile_path, render, *args, **kwargs)
+                result['profile'] = profile_report(profile_path)
+                result['profile_path'] = profile_path
+            self.render_queue.put(('done', result))
+        except RenderCancelled:
+            self.render_queue.put(('cancelled',))
+        except Exception as e:
+            self.render_queue.put(('error', e))
+
+    def poll_render_queue(self):
+        while self.render_thread is not None:
+            try:
+                message = self.render_queue.get_nowait()
+            except queue.Empty:
+                self.master.after(RENDER_POLL_MS, self.poll_render_queue)
+                return
+
+            kind = message[0]
+            if kind == 'progress':
+                start = time.perf_counter()
+                self.progress_var.set(message[1] * 100)
+                self.master.update_idletasks()
+                self.render_ui_time += time.perf_counter() - start
+            elif kind == 'done':
+                result = message[1]
+                timings = result['timings']
+                timings.add('ui', self.render_ui_time)
+                self.finish_render()
+                self.processed_result = result
+                with timings.measure('plot'):
+                    self.plot_original(result['pyramid_original'])
+                    self.plot_processed(result)
+                    if self.spectrum_window is not None and self.spectrum_window.winfo_exists():
+                        self.plot_spectrum(result)
+                if 'profile' in result or (self.stats_window is not None and self.stats_window.winfo_exists()):
+                    self.show_stats()
+                if 'job' in result:
+                    source = f" (serwer, zadanie {result['job']}{', z pamięci podręcznej' if result['cached'] else ''})"
+                elif result['cached']:
+                    source = " (z pamięci podręcznej)"
+                elif result['first_stage']:
+                    source = f" (przeliczono od etapu {result['first_stage'] + 1})"
+                else:
+                    source = ""
+                messagebox.showinfo("Zastosowano efekt", f"Efekt został zastosowany i zapisany do pliku.\nCzas aplikowania efektu: {result['elapsed_time']:.2f} sekundy{source}")
+            elif kind == 'cancelled':
+                self.finish_render()
+                messagebox.showinfo("Anulowano", "Przetwarzanie zostało anulowane.")
+            elif kind == 'error':
+                self.finish_render()
+                tk.messagebox.showerror("Błąd", f"Wystąpił błąd podczas przetwarzania pliku: {message[1]}")
+
+    def cancel_render(self):
+        if self.render_cancel is not None:
+            self.render_cancel.set()
+            self.cancel_button.config(state=tk.DISABLED)
+
+    def finish_render(self):
+        self.render_thread = None
+        self.render_cancel = None
+
+        self.progress_bar.place_forget()
+        self.progress_label.place_forget()
+        self.cancel_button.place_forget()
+
+    def plot_original(self, pyramid_original):
+        self.original_view.show([(pyramid_original, 'orange')])
+
+    def plot_processed(self, result):
+        from matplotlib.lines import Line2D
+
+        self.processed_view.show([(result['pyramid_processed'], 'blue')])
+        legend_handles = [Line2D([], [], color='orange', label='Oryginalny'),
+                          Line2D([], [], color='blue', label='Przetworzony')]
+        self.combined_view.show([(result['pyramid_processed'], 'blue'), (result['pyramid_original'], 'orange')],
+                                legend_handles=legend_handles)
+
+    def show_spectrum(self):
+        if self.processed_result is None:
+            tk.messagebox.showwarning("Brak przetworzonego pliku", "Najpierw zastosuj efekt.")
+            return
 
-            self.ax.clear()
-            self.ax.plot(np.arange(len(normalized_signal)) / fs, normalized_signal, color='blue', linewidth=0.5)
-            self.ax.set_title('Przetworzony')
-            self.ax.set_xlabel('Czas (s)')
-            self.ax.set_ylabel('Amplituda')
-            self.ax.grid(True)
-            self.canvas.draw()
+        if self.spectrum_window is None or not self.spectrum_window.winfo_exists():
+            self.spectrum_window = tk.Toplevel(self.master)
+            self.spectrum_window.title("Widmo")
+            _, self.spectrum_axes, self.spectrum_canvas = create_figure(self.spectrum_window, 3, (8, 8))
+            self.spectrum_canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        self.spectrum_window.lift()
+        self.plot_spectrum(self.processed_result)
+
+    def plot_spectrum(self, result):
+        ax_original, ax_processed, ax_average = self.spectrum_axes
+        for ax, spectrum, title in ((ax_original, result['spectrum_original'], 'Spektrogram: oryginalny'),
+                                    (ax_processed, result['spectrum_processed'], 'Spektrogram: przetworzony')):
+            times, freqs, db = spectrum.spectrogram()
+            ax.clear()
+            ax.pcolormesh(times, freqs, db, vmin=-100, vmax=0, cmap='magma', shading='flat')
+            ax.set_title(title)
+            ax.set_ylabel('Częstotliwość [Hz]')
+        ax_processed.set_xlabel('Czas [s]')
+
+        ax_average.clear()
+        for spectrum, color, label in ((result['spectrum_original'], 'orange', 'Oryginalny'),
+                                       (result['spectrum_processed'], 'blue', 'Przetworzony')):
+            freqs, db = spectrum.average()
+            ax_average.semilogx(freqs[1:], db[1:], color=color, label=label, linewidth=0.8)
+        ax_average.set_title('Średnie widmo')
+        ax_average.set_xlabel('Częstotliwość [Hz]')
+        ax_average.set_ylabel('dB')
+        ax_average.legend()
+        self.spectrum_canvas.draw()
+
+    def show_stats(self):
+        if self.processed_result is None:
+            tk.messagebox.showwarning("Brak przetworzonego pliku", "Najpierw zastosuj efekt.")
+            return
 
-            self.ax_combined.clear()
-            self.ax_combined.plot(np.arange(len(signal)) / fs, normalized_signal, color='blue', linewidth=0.5)
-            self.ax_combined.plot(np.arange(len(signal_original)) / fs_original, signal_original, color='orange', linewidth=0.5)
-            self.ax_combined.set_title('Połączone wykresy')
-            self.ax_combined.set_xlabel('Czas (s)')
-            self.ax_combined.set_ylabel('Amplituda')
-            self.ax_combined.grid(True)
-            
-            self.ax_combined.legend(handles=[self.original_handle, self.processed_handle], loc='lower left')
-            
-            self.canvas_combined.draw()
+        if self.stats_window is None or not self.stats_window.winfo_exists():
+            self.stats_window = tk.Toplevel(self.master)
+            self.stats_window.title("Statystyki renderowania")
+
+            self.stage_tree = ttk.Treeview(self.stats_window, columns=('time', 'calls', 'share'), height=10)
+            self.stage_tree.heading('#0', text='Etap')
+            self.stage_tree.heading('time', text='Czas [ms]')
+            self.stage_tree.heading('calls', text='Wywołania')
+            self.stage_tree.heading('share', text='Udział')
+            self.block_label = ttk.Label(self.stats_window, text="", justify=tk.LEFT)
+            self.histogram_tree = ttk.Treeview(self.stats_window, columns=('count',), height=11)
+            self.histogram_tree.heading('#0', text='Czas bloku do')
+            self.histogram_tree.heading('count', text='Liczba bloków')
+            self.profile_text = tk.Text(self.stats_window, width=100, height=20, font='TkFixedFont')
+
+            buttons = ttk.Frame(self.stats_window)
+            ttk.Button(buttons, text="Zapisz JSON", command=lambda: self.save_stats('.json')).pack(side=tk.LEFT)
+            ttk.Button(buttons, text="Zapisz CSV", command=lambda: self.save_stats('.csv')).pack(side=tk.LEFT)
+
+            self.stage_tree.pack(fill=tk.X, padx=5, pady=5)
+            self.block_label.pack(anchor=tk.W, padx=5)
+            self.histogram_tree.pack(fill=tk.X, padx=5, pady=5)
+            buttons.pack(anchor=tk.W, padx=5)
+            self.profile_text.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.stats_window.lift()
+        self.fill_stats(self.processed_result)
+
+    def fill_stats(self, result):
+        summary = result['timings'].summary()
+
+        self.stage_tree.delete(*self.stage_tree.get_children())
+        for row in summary['stages']:
+            self.stage_tree.insert('', tk.END, text=row['stage'],
+                                   values=(f"{row['seconds'] * 1000:.1f}", row['calls'], f"{row['share']:.0%}"))
+        self.stage_tree.insert('', tk.END, text='render', values=(f"{summary['render_time'] * 1000:.1f}", '', ''))
+
+        blocks = summary['blocks']
+        if blocks['count']:
+            self.block_label.config(
+                text=f"Bloki DSP: {blocks['count']}, średnio {blocks['mean_ms']:.3f} ms, p50 {blocks['p50_ms']:.3f} ms, "
+                     f"p95 {blocks['p95_ms']:.3f} ms, p99 {blocks['p99_ms']:.3f} ms, maks. {blocks['max_ms']:.3f} ms\n"
+                     f"{blocks['realtime_factor']:.0f}x czasu rzeczywistego, "
+                     f"najwolniejszy blok: {blocks['max_load']:.1%} budżetu")
+        else:
+            self.block_label.config(text="Bloki DSP: brak (wynik z pamięci podręcznej)")
 
-            messagebox.showinfo("Zastosowano efekt", f"Efekt został zastosowany i zapisany do pliku.\nCzas aplikowania efektu: {elapsed_time:.2f} sekundy")
+        self.histogram_tree.delete(*self.histogram_tree.get_children())
+        for row in summary['histogram']:
+            label = f"{row['up_to_ms']:g} ms" if row['up_to_ms'] is not None else "więcej"
+            self.histogram_tree.insert('', tk.END, text=label, values=(row['count'],))
 
-            self.progress_bar.place_forget()
-            self.progress_label.place_forget()
+        self.profile_text.delete('1.0', tk.END)
+        if 'profile' in result:
+            self.profile_text.insert(tk.END, f"Profil zapisany do {result['profile_path']}\n\n{result['profile']}")
+        else:
+            self.profile_text.insert(tk.END, "Zaznacz cProfile, aby sprofilować następne renderowanie.")
 
+    def save_stats(self, extension):
+        path = filedialog.asksaveasfilename(parent=self.stats_window, defaultextension=extension,
+                                            initialdir=OUTPUT_FOLDER, initialfile='render_stats' + extension,
+                                            filetypes=[(extension[1:].upper(), '*' + extension)])
+        if not path:
+            return
+        try:
+            self.processed_result['timings'].write(path)
+        except OSError as e:
+            tk.messagebox.showerror("Błąd", f"Nie udało się zapisać statystyk: {e}", parent=self.stats_window)
+
+    def ensure_playback(self, fs):
+        # The output stream stays open between clicks and is only reopened
+        # when a file with a different sample rate is played.
+        if self.playback is not None and self.playback.fs == fs:
+            return self.playback
+        if self.playback is not None:
+            self.playback.close()
+        self.playback = PlaybackEngine(fs)
+        self.playback.start()
+        self.on_loop_toggle()
+        return self.playback
+
+    def seek_playback(self, seconds):
+        if self.playback is not None:
+            self.playback.seek(seconds)
+
+    def on_loop_toggle(self):
+        if self.playback is None:
+            return
+        if self.loop_var.get():
+            region = self.original_view.visible_region() or (self.original_view.start, self.original_view.end)
+            self.playback.set_loop(*region)
+        else:
+            self.playback.set_loop()
 
+    def play_preview(self, fs, processed, region):
+        try:
+            playback = self.ensure_playback(fs)
         except Exception as e:
-            tk.messagebox.showerror("Błąd", f"Wystąpił błąd podczas przetwarzania pliku: {e}")
-
+            self.preview_label.config(text=f"Błąd odtwarzania: {e}")
+            return
+        playback.set_source('preview', processed, offset=region[0])
+        playback.set_loop(*region)
+        if playback.current != 'preview' or not playback.playing:
+            playback.seek(region[0])
+        playback.play('preview')
 
     def play_original(self):
         file_path = self.file_path_var.get()
@@ -523,34 +1111,69 @@ class GuitarEffectsApp:
             tk.messagebox.showwarning("Brak pliku", "Proszę wybrać plik dźwiękowy.")
             return
         try:
-            self.original_data, fs = sf.read(file_path)
-            sd.play(self.original_data, fs)
+            fs, self.original_data = decode_cached(file_path, self.render_cache)
+            playback = self.ensure_playback(fs)
+            playback.set_source('original', self.original_data)
+            playback.play('original')
         except Exception as e:
             tk.messagebox.showerror("Błąd", f"Wystąpił błąd podczas odtwarzania pliku: {e}")
 
     def play_processed(self):
-        output_path = os.path.join(os.path.dirname(__file__), 'processed output', 'output.wav')
-        if not os.path.exists(output_path):
-            tk.messagebox.showwarning("Brak przetworzonego pliku", "Nie znaleziono przetworzonego pliku dźwiękowego.")
-            return
+        if self.processed_result is not None and 'audio' in self.processed_result:
+            fs, self.processed_data = self.processed_result['fs'], self.processed_result['audio']
+        else:
+            output_path = os.path.join(OUTPUT_FOLDER, 'output.wav')
+            if not os.path.exists(output_path):
+                tk.messagebox.showwarning("Brak przetworzonego pliku", "Nie znaleziono przetworzonego pliku dźwiękowego.")
+                return
+            try:
+                fs, self.processed_data = read_audio(output_path)
+            except Exception as e:
+                tk.messagebox.showerror("Błąd", f"Wystąpił błąd podczas odtwarzania pliku: {e}")
+                return
+
         try:
-            self.processed_data, fs = sf.read(output_path)
-            sd.play(self.processed_data, fs)
+            playback = self.ensure_playback(fs)
+            playback.set_source('processed', self.processed_data)
+            playback.play('processed')
         except Exception as e:
             tk.messagebox.showerror("Błąd", f"Wystąpił błąd podczas odtwarzania pliku: {e}")
 
     def stop_original(self):
-        sd.stop()
+        if self.playback is not None:
+            self.playback.pause()
 
     def stop_processed(self):
-        sd.stop()
+        if self.playback is not None:
+            self.playback.pause()
 
 
-if __name__ == "__main__":
+def create_window(server=None):
+    from ttkthemes import ThemedTk
+
     root = ThemedTk(theme="breeze")
-    selected_theme = 'seaborn-v0_8'
-    plt.style.use(selected_theme)
-    app = GuitarEffectsApp(root)
-    root.geometry("1450x700")  
+    app = GuitarEffectsApp(root, server)
+    root.geometry("1450x700")
+    return root, app
 
-    root.mainloop()
\ No newline at end of file
+
+def run_gui(server=None):
+    root, app = create_window(server)
+    root.mainloop()
+
+
+def main(argv=None):
+    parser = build_parser()
+    parser.add_argument('--server', default=None, metavar='URL',
+                        help="wysyłaj renderowanie do serwera, np. http://127.0.0.1:8765")
+    args = parser.parse_args(argv)
+
+    if args.command is not None:
+        return run_command(parser, args)
+
+    run_gui(args.server)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,2502 @@
+import os
+import time
+import threading
+import argparse
+import csv
+import glob
+import hashlib
+import json
+import pickle
+import sqlite3
+import tempfile
+import itertools
+from collections import OrderedDict
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+DEFAULT_BLOCK_SIZE = 8192
+MAX_TAIL_SECONDS = 10
+TAIL_THRESHOLD = 1e-4
+PYRAMID_BUCKET = 64
+CONTROL_FRAMES = 32
+OVERSAMPLE_FACTORS = (1, 2, 4)
+OVERSAMPLE_TAPS = 16
+OVERSAMPLE_BETA = 8.0
+OVERSAMPLE_CUTOFF = 0.9
+SPECTRUM_FFT_SIZE = 2048
+SPECTRUM_HOP = 512
+SPECTRUM_BINS = 256
+SPECTRUM_COLUMNS = 1024
+NORMALIZE_PEAK_DB = -1.0
+NORMALIZE_MODES = ["match_input", "peak"]
+DEFAULT_LIVE_BLOCK_SIZE = 128
+PLAYBACK_BLOCK_SIZE = 512
+CROSSFADE_SECONDS = 0.02
+RECORDING_BUFFER_SECONDS = 10
+RECORDING_WRITE_FRAMES = 16384
+RECORDING_POLL_SECONDS = 0.05
+SWEEP_STEPS = 3
+SWEEP_RANDOM_ATTEMPTS = 100
+LATENCY_HISTOGRAM_MS = [0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 50, 100]
+PROFILE_LINES = 25
+SERVER_HOST = '127.0.0.1'
+SERVER_PORT = 8765
+SERVER_WORKERS = 2
+SERVER_MAX_QUEUE = 64
+SERVER_KEEP_JOBS = 200
+OUTPUT_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'processed output')
+SERVER_OUTPUT_FOLDER = os.path.join(OUTPUT_FOLDER, 'server')
+CACHE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'render cache')
+CACHE_MEMORY_BYTES = 512 * 2 ** 20
+CACHE_DISK_BYTES = 2 * 2 ** 30
+CACHE_PARAM_DIGITS = 3
+# Bumped whenever decoding or the layout of cached entries changes.
+CACHE_VERSION = 2
+HASH_CHUNK_BYTES = 2 ** 20
+LIBRARY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'library.sqlite')
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.flac', '.ogg', '.aif', '.aiff')
+# Renders and cache entries of the app itself never belong in the library.
+LIBRARY_SKIP_FOLDERS = (OUTPUT_FOLDER, CACHE_FOLDER)
+THUMBNAIL_POINTS = 1024
+
+EFFECT_PARAM_NAMES = {
+    "Chorus": ["rate_hz", "depth", "centre_delay_ms", "feedback", "mix"],
+    "Reverb": ["room_size", "damping", "wet_level", "dry_level", "width", "freeze_mode"],
+    "Distortion": ["drive_db"],
+    "Phaser": ["rate_hz", "depth", "centre_frequency_hz", "feedback", "mix"],
+    "Delay": ["delay_time", "decay"],
+    "Tremolo": ["rate_hz", "depth"],
+    "NoiseGate": ["threshold_db", "attack_ms", "release_ms", "floor_db"],
+    "Compressor": ["threshold_db", "ratio", "attack_ms", "release_ms", "makeup_db"],
+    "TunedDelay": ["bpm", "beats", "feedback", "mix"],
+    "Overdrive": ["drive_db", "level", "oversampling"]
+}
+
+EFFECT_PARAM_RANGES = {
+    "Chorus": {"rate_hz": (0, 100), "depth": (0, 1), "centre_delay_ms": (0, 100), "feedback": (-1, 1),
+               "mix": (0, 1)},
+    "Reverb": {"room_size": (0, 1), "damping": (0, 1), "wet_level": (0, 1), "dry_level": (0, 1), "width": (0, 1),
+               "freeze_mode": (0, 1)},
+    "Distortion": {"drive_db": (0, 50)},
+    "Phaser": {"rate_hz": (0, 100), "depth": (0, 1), "centre_frequency_hz": (0, 1300), "feedback": (-1, 1),
+               "mix": (0, 1)},
+    "Delay": {"delay_time": (0, 2), "decay": (0, 1)},
+    "Tremolo": {"rate_hz": (0, 20), "depth": (0, 1)},
+    "NoiseGate": {"threshold_db": (-100, 0), "attack_ms": (0.1, 50), "release_ms": (1, 1000), "floor_db": (-100, 0)},
+    "Compressor": {"threshold_db": (-60, 0), "ratio": (1, 20), "attack_ms": (0.1, 100), "release_ms": (1, 1000),
+                   "makeup_db": (0, 24)},
+    "TunedDelay": {"bpm": (40, 240), "beats": (0.25, 4), "feedback": (0, 0.95), "mix": (0, 1)},
+    "Overdrive": {"drive_db": (0, 50), "level": (0, 1), "oversampling": (1, 4)}
+}
+
+BOARD_EFFECTS = ["Chorus", "Reverb", "Distortion", "Phaser"]
+
+
+def to_float32(signal):
+    signal = np.asarray(signal)
+    if signal.dtype == np.uint8:
+        return (signal.astype(np.float32) - 128) / 128
+    if np.issubdtype(signal.dtype, np.integer):
+        return signal.astype(np.float32) / -np.iinfo(signal.dtype).min
+    return signal.astype(np.float32, copy=False)
+
+
+class DelayLine:
+    def __init__(self, fs, delay_time=0.5, decay=0.5):
+        self.fs = fs
+        self.delay_samples = int(delay_time * fs)
+        self.decay = decay
+        self.reset()
+
+    @property
+    def silence_gap(self):
+        return self.delay_samples
+
+    def reset(self):
+        self.history = None
+        self.position = 0
+
+    def update(self, params):
+        if int(params.get('delay_time', self.delay_samples / self.fs) * self.fs) != self.delay_samples:
+            return False
+        self.decay = params.get('decay', self.decay)
+        return True
+
+    def process(self, block, out=None):
+        block = np.asarray(block)
+        if not np.issubdtype(block.dtype, np.floating):
+            block = block.astype(np.float64)
+
+        if out is None:
+            out = np.empty(block.shape, dtype=block.dtype)
+        frames = out.reshape(len(out), -1)
+        np.copyto(frames, block.reshape(len(block), -1))
+
+        if self.delay_samples == 0 or len(frames) == 0:
+            return out
+
+        if self.history is None or self.history.shape[1] != frames.shape[1]:
+            self.history = np.zeros((self.delay_samples, frames.shape[1]), dtype=frames.dtype)
+            self.position = 0
+
+        # The history holds the last delay_samples outputs with the oldest one at
+        # self.position, so a segment that does not wrap the ring only depends on
+        # outputs that are already known and can be computed in one step. The
+        # history slice is updated in place, which keeps the loop allocation free.
+        start = 0
+        while start < len(frames):
+            length = min(len(frames) - start, self.delay_samples - self.position)
+            segment = frames[start:start + length]
+            history = self.history[self.position:self.position + length]
+            history *= self.decay
+            history += segment
+            segment[...] = history
+
+            start += length
+            self.position = (self.position + length) % self.delay_samples
+
+        return out
+
+
+def delay_effect(chunk, fs, delay_time, decay):
+    delayed_chunk = DelayLine(fs, delay_time, decay).process(chunk)
+
+    return delayed_chunk.astype(np.asarray(chunk).dtype, copy=False)
+
+
+class BlockEffect:
+    # Base for the NumPy effects. Parameters are plain attributes with the
+    # defaults below, configure() derives coefficients from them, and all
+    # state that carries over between blocks is created by reset()/prepare().
+    # process() works on (frames, channels) float32 blocks and, like the other
+    # processors, may be given the input block itself as out.
+    defaults = {}
+    silence_gap = 0
+
+    def __init__(self, fs, **params):
+        self.fs = fs
+        for name in params:
+            if name not in self.defaults:
+                raise TypeError(f"{type(self).__name__} nie ma parametru {name}")
+        for name, value in dict(self.defaults, **params).items():
+            setattr(self, name, float(value))
+        self.configure()
+        self.reset()
+
+    def configure(self):
+        pass
+
+    def reset(self):
+        self.channels = None
+
+    def prepare(self, channels):
+        pass
+
+    def rebuilds(self, params):
+        return False
+
+    def update(self, params):
+        # Runs on another thread than process(), so only parameters that
+        # leave the state buffers alone are changed in place. Anything that
+        # would resize or replace them needs a new processor, as with
+        # DelayLine.
+        if any(name not in self.defaults for name in params) or self.rebuilds(params):
+            return False
+        for name, value in params.items():
+            setattr(self, name, float(value))
+        self.configure()
+        return True
+
+    def process(self, block, out=None):
+        block = to_float32(block)
+        if out is None:
+            out = np.empty(block.shape, dtype=np.float32)
+        frames = block.reshape(len(block), -1)
+        if self.channels != frames.shape[1]:
+            self.channels = frames.shape[1]
+            self.prepare(self.channels)
+        if len(frames):
+            self.process_block(frames, out.reshape(len(out), -1))
+        return out
+
+    def process_block(self, block, out):
+        raise NotImplementedError
+
+
+def smooth_gains(targets, gain, rise, fall, out):
+    # One-pole smoothing with separate coefficients for rising and falling
+    # gain. The loop runs once per control step, not per sample.
+    for index, target in enumerate(targets):
+        gain = target + (rise if target > gain else fall) * (gain - target)
+        out[index] = gain
+    return out
+
+
+def apply_gain(block, gain, out):
+    # One channel at a time: multiplying by a broadcast gain column makes
+    # NumPy buffer a copy of the whole block.
+    for channel in range(block.shape[1]):
+        np.multiply(block[:, channel], gain, out=out[:, channel])
+    return out
+
+
+def lowpass_taps(count, cutoff, beta=OVERSAMPLE_BETA):
+    # Kaiser-windowed sinc with unity DC gain; cutoff is a fraction of the
+    # sample rate the filter runs at.
+    n = np.arange(count) - (count - 1) / 2
+    taps = np.sinc(2 * cutoff * n) * np.kaiser(count, beta)
+    return taps / taps.sum()
+
+
+class Oversampler:
+    # Polyphase resampler around a nonlinear stage: each input block is
+    # upsampled by factor, handed to stage() in place at factor * fs, then
+    # filtered and decimated back into out. Both filters keep their history
+    # between blocks, so block boundaries are seamless.
+    def __init__(self, factor, taps_per_phase=OVERSAMPLE_TAPS):
+        self.factor = factor
+        self.taps = taps_per_phase
+        length = factor * taps_per_phase
+        taps = lowpass_taps(length, OVERSAMPLE_CUTOFF / (2 * factor))
+        # Row t of the upsampling matrix multiplies the input sample t places
+        # into the window and column k produces output phase k.
+        self.up = np.ascontiguousarray(taps.reshape(taps_per_phase, factor)[::-1] * factor, dtype=np.float32)
+        self.down = np.ascontiguousarray(taps[::-1], dtype=np.float32)
+        self.latency = (length - 1) / factor
+        self.reset()
+
+    def reset(self):
+        self.input = None
+        self.frames = None
+
+    def prepare(self, frames, channels):
+        # The buffers and the window views over them are rebuilt only when the
+        # block size or channel count changes, as they do not in a stream.
+        if frames == self.frames and self.input.shape[1] == channels:
+            return
+        history = self.taps - 1
+        up_history = history * self.factor
+        input_history = upsampled_history = None
+        if self.input is not None and self.input.shape[1] == channels:
+            input_history, upsampled_history = self.input[:history].copy(), self.upsampled[:up_history].copy()
+
+        self.input = np.zeros((history + frames, channels), dtype=np.float32)
+        self.upsampled = np.zeros((up_history + frames * self.factor, channels), dtype=np.float32)
+        if input_history is not None:
+            self.input[:history] = input_history
+            self.upsampled[:up_history] = upsampled_history
+        self.phases = np.empty((frames, channels, self.factor), dtype=np.float32)
+        self.high_rate = self.upsampled[up_history:]
+        self.up_windows = np.lib.stride_tricks.sliding_window_view(self.input, self.taps, axis=0)
+        self.down_windows = np.lib.stride_tricks.sliding_window_view(self.upsampled, len(self.down),
+                                                                     axis=0)[::self.factor]
+        self.frames = frames
+
+    def process(self, block, out, stage):
+        frames, channels = block.shape
+        history = self.taps - 1
+        up_history = history * self.factor
+        self.prepare(frames, channels)
+
+        self.input[history:] = block
+        np.matmul(self.up_windows, self.up, out=self.phases)
+        self.high_rate.reshape(frames, self.factor, channels)[...] = self.phases.transpose(0, 2, 1)
+        stage(self.high_rate)
+        np.matmul(self.down_windows, self.down, out=out)
+
+        self.input[:history] = self.input[frames:]
+        self.upsampled[:up_history] = self.upsampled[frames * self.factor:]
+        return out
+
+
+class Tremolo(BlockEffect):
+    defaults = {'rate_hz': 5.0, 'depth': 0.5}
+
+    def reset(self):
+        super().reset()
+        self.phase = 0.0
+        self.ramp = self.gain = np.arange(0, dtype=np.float32)
+
+    def process_block(self, block, out):
+        frames = len(block)
+        if len(self.ramp) < frames:
+            self.ramp = np.arange(frames, dtype=np.float32)
+            self.gain = np.empty(frames, dtype=np.float32)
+        step = 2 * np.pi * self.rate_hz / self.fs
+        gain = np.multiply(self.ramp[:frames], step, out=self.gain[:frames])
+        gain += self.phase
+        np.cos(gain, out=gain)
+        gain *= 0.5 * self.depth
+        gain += 1 - 0.5 * self.depth
+        apply_gain(block, gain, out)
+        self.phase = (self.phase + step * frames) % (2 * np.pi)
+
+
+class EnvelopeEffect(BlockEffect):
+    # Gain computed at control rate from the peak level of CONTROL_FRAMES
+    # sample steps (linked across channels) and smoothed with attack and
+    # release times. Each step ramps towards the gain of the step before it,
+    # so the curve only depends on finished steps and the control grid runs
+    # on across block boundaries.
+    def configure(self):
+        step_seconds = CONTROL_FRAMES / self.fs
+        self.attack = np.exp(-step_seconds / max(self.attack_ms / 1000, 1e-6))
+        self.release = np.exp(-step_seconds / max(self.release_ms / 1000, 1e-6))
+
+    def reset(self):
+        super().reset()
+        self.previous_db = self.gain_db = 0.0
+        self.step_frames = 0
+        self.step_peak = 0.0
+        self.envelope = np.empty(0, dtype=np.float32)
+        self.magnitude = np.empty((0, 1), dtype=np.float32)
+
+    def prepare_buffers(self, frames, channels):
+        # Scratch buffers for the sample-rate and control-rate stages, grown
+        # when a longer block arrives so a stream of blocks allocates nothing.
+        if len(self.envelope) < frames:
+            steps = frames // CONTROL_FRAMES + 3
+            self.envelope = np.empty(frames, dtype=np.float32)
+            self.step_index = np.arange(steps)
+            self.starts = np.empty(steps, dtype=np.intp)
+            self.peaks = np.empty(steps, dtype=np.float32)
+            self.levels = np.empty(steps)
+            self.mask = np.empty(steps, dtype=bool)
+            self.knots = np.empty(steps)
+            self.slopes = np.empty(steps, dtype=np.float32)
+            self.ramps = np.tile(np.arange(CONTROL_FRAMES, dtype=np.float32), (steps, 1))
+            self.grid = np.empty((steps, CONTROL_FRAMES), dtype=np.float32)
+            self.bases = np.empty((steps, CONTROL_FRAMES), dtype=np.float32)
+        if len(self.magnitude) < frames or self.magnitude.shape[1] != channels:
+            self.magnitude = np.empty((len(self.envelope), channels), dtype=np.float32)
+
+    def target_gains(self, levels):
+        # Turns the step levels in dB into target gains in dB, in place.
+        raise NotImplementedError
+
+    def smooth(self, targets, out):
+        raise NotImplementedError
+
+    def process_block(self, block, out):
+        frames, channels = block.shape
+        self.prepare_buffers(frames, channels)
+
+        magnitude = np.abs(block, out=self.magnitude[:frames])
+        envelope = np.max(magnitude, axis=1, out=self.envelope[:frames])
+        first_end = CONTROL_FRAMES - self.step_frames
+        if first_end > frames:
+            self.step_peak = max(self.step_peak, float(envelope.max()))
+            self.step_frames += frames
+            done = 0
+        else:
+            count = (frames - first_end - 1) // CONTROL_FRAMES + 2
+            starts = np.multiply(self.step_index[:count], CONTROL_FRAMES, out=self.starts[:count])
+            starts += first_end - CONTROL_FRAMES
+            starts[0] = 0
+            peaks = np.maximum.reduceat(envelope, starts, out=self.peaks[:count])
+            peaks[0] = max(peaks[0], self.step_peak)
+            done = (frames - first_end) // CONTROL_FRAMES + 1
+            self.step_frames = frames - first_end - (done - 1) * CONTROL_FRAMES
+            self.step_peak = float(peaks[done]) if done < count else 0.0
+            levels = np.maximum(peaks[:done], 1e-10, out=self.levels[:done])
+            np.log10(levels, out=levels)
+            levels *= 20
+            self.target_gains(levels)
+            self.smooth(levels, self.knots[2:done + 2])
+
+        # Knots sit on the last sample of each step, starting with the one
+        # before the step this block begins in. Row i of the grid is the line
+        # from knot i towards knot i + 1, so the rows laid end to end are the
+        # gain curve from the first knot on. The per-row values are spread
+        # with copyto, as broadcasting them in arithmetic makes NumPy buffer
+        # a copy of the whole grid.
+        knots = self.knots[:done + 2]
+        knots[0], knots[1] = self.previous_db, self.gain_db
+        slopes = np.subtract(knots[1:], knots[:-1], out=self.slopes[:done + 1], casting='same_kind')
+        slopes /= CONTROL_FRAMES
+        grid, bases = self.grid[:done + 1], self.bases[:done + 1]
+        np.copyto(grid, slopes[:, None])
+        grid *= self.ramps[:done + 1]
+        np.copyto(bases, knots[:-1, None], casting='same_kind')
+        grid += bases
+        offset = CONTROL_FRAMES + 1 - first_end
+        curve = self.grid.reshape(-1)[offset:offset + frames]
+        self.previous_db, self.gain_db = float(knots[-2]), float(knots[-1])
+
+        curve *= np.float32(np.log(10) / 20)
+        np.exp(curve, out=curve)
+        apply_gain(block, curve, out)
+
+
+class NoiseGate(EnvelopeEffect):
+    defaults = {'threshold_db': -50.0, 'attack_ms': 1.0, 'release_ms': 100.0, 'floor_db': -80.0}
+
+    def target_gains(self, levels):
+        closed = np.less(levels, self.threshold_db, out=self.mask[:len(levels)])
+        np.multiply(closed, self.floor_db, out=levels)
+
+    def smooth(self, targets, out):
+        return smooth_gains(targets, self.gain_db, self.attack, self.release, out)
+
+
+class Compressor(EnvelopeEffect):
+    defaults = {'threshold_db': -20.0, 'ratio': 4.0, 'attack_ms': 5.0, 'release_ms': 100.0, 'makeup_db': 0.0}
+
+    def target_gains(self, levels):
+        levels -= self.threshold_db
+        np.maximum(levels, 0.0, out=levels)
+        levels *= -(1 - 1 / max(self.ratio, 1.0))
+
+    def smooth(self, targets, out):
+        # The smoothed value is the gain reduction, makeup is added after.
+        smooth_gains(targets, self.gain_db - self.makeup_db, self.release, self.attack, out)
+        out += self.makeup_db
+        return out
+
+
+class TunedDelay(BlockEffect):
+    # Feedback delay with its time given as a number of beats at a tempo.
+    defaults = {'bpm': 120.0, 'beats': 0.5, 'feedback': 0.4, 'mix': 0.35}
+
+    def delay_length(self, bpm, beats):
+        return max(int(round(60 / max(bpm, 1e-3) * beats * self.fs)), 1)
+
+    def configure(self):
+        self.delay_samples = self.delay_length(self.bpm, self.beats)
+
+    def rebuilds(self, params):
+        return self.delay_length(params.get('bpm', self.bpm), params.get('beats', self.beats)) != self.delay_samples
+
+    @property
+    def silence_gap(self):
+        return self.delay_samples
+
+    def reset(self):
+        super().reset()
+        self.history = None
+        self.position = 0
+        self.wet = np.empty((0, 1), dtype=np.float32)
+
+    def prepare(self, channels):
+        self.history = None
+
+    def process_block(self, block, out):
+        frames, channels = block.shape
+        if self.history is None:
+            self.history = np.zeros((self.delay_samples, channels), dtype=np.float32)
+            self.position = 0
+        if self.wet.shape[1] != channels or len(self.wet) < min(frames, self.delay_samples):
+            self.wet = np.empty((min(frames, self.delay_samples), channels), dtype=np.float32)
+
+        # Same ring layout as DelayLine: a segment that does not wrap only
+        # reads delayed samples written before it, so it is one vector step.
+        start = 0
+        while start < frames:
+            length = min(frames - start, self.delay_samples - self.position)
+            wet = np.multiply(self.history[self.position:self.position + length], self.mix, out=self.wet[:length])
+            history = self.history[self.position:self.position + length]
+            history *= self.feedback
+            history += block[start:start + length]
+            segment = out[start:start + length]
+            np.multiply(block[start:start + length], 1 - self.mix, out=segment)
+            segment += wet
+
+            start += length
+            self.position = (self.position + length) % self.delay_samples
+
+
+class Overdrive(BlockEffect):
+    # tanh waveshaper; oversampling is 1, 2 or 4 and keeps the harmonics the
+    # curve generates above fs / 2 from folding back as aliasing.
+    defaults = {'drive_db': 20.0, 'level': 0.5, 'oversampling': 4.0}
+
+    @staticmethod
+    def oversampling_factor(oversampling):
+        return min(OVERSAMPLE_FACTORS, key=lambda factor: abs(factor - oversampling))
+
+    def configure(self):
+        self.gain = 10 ** (self.drive_db / 20)
+        factor = self.oversampling_factor(self.oversampling)
+        if getattr(self, 'factor', None) != factor:
+            self.oversampler = Oversampler(factor) if factor > 1 else None
+            self.factor = factor
+
+    def rebuilds(self, params):
+        return self.oversampling_factor(params.get('oversampling', self.oversampling)) != self.factor
+
+    def reset(self):
+        super().reset()
+        if self.oversampler is not None:
+            self.oversampler.reset()
+
+    def shape(self, signal):
+        signal *= self.gain
+        np.tanh(signal, out=signal)
+        signal *= self.level
+
+    def process_block(self, block, out):
+        if self.oversampler is None:
+            np.copyto(out, block)
+            self.shape(out)
+        else:
+            self.oversampler.process(block, out, self.shape)
+
+
+BLOCK_EFFECTS = {
+    "Tremolo": Tremolo,
+    "NoiseGate": NoiseGate,
+    "Compressor": Compressor,
+    "TunedDelay": TunedDelay,
+    "Overdrive": Overdrive
+}
+
+
+class BoardProcessor:
+    silence_gap = 0
+
+    def __init__(self, board, fs):
+        self.board = board
+        self.fs = fs
+        self.channels_first = None
+
+    def reset(self):
+        self.board.reset()
+
+    def update(self, params):
+        if len(self.board) != 1:
+            return False
+        for name, value in params.items():
+            setattr(self.board[0], name, value)
+        return True
+
+    def process(self, block, out=None):
+        # Pedalboard keeps the plugin state between calls only with reset=False
+        # and expects channels-first audio, which is staged in a reused buffer.
+        if self.channels_first is None or self.channels_first.shape != block.shape[::-1]:
+            self.channels_first = np.empty(block.shape[::-1], dtype=np.float32)
+        np.copyto(self.channels_first, block.T)
+        processed = self.board(self.channels_first, self.fs, reset=False).T
+        if out is None:
+            return processed
+        np.copyto(out, processed)
+        return out
+
+
+class ChainProcessor:
+    def __init__(self, processors):
+        self.processors = processors
+
+    @property
+    def silence_gap(self):
+        return sum(getattr(processor, 'silence_gap', 0) for processor in self.processors)
+
+    def reset(self):
+        for processor in self.processors:
+            processor.reset()
+
+    def update(self, params):
+        return False
+
+    def process(self, block, out=None):
+        # The first stage writes into out and every later stage works on it in
+        # place, so the chain needs no buffers of its own.
+        if out is None:
+            out = np.empty(block.shape, dtype=np.float32)
+        self.processors[0].process(block, out=out)
+        for processor in self.processors[1:]:
+            processor.process(out, out=out)
+        return out
+
+
+class StreamingRenderer:
+    def __init__(self, processor, fs, block_size=DEFAULT_BLOCK_SIZE, flush_tail=True,
+                 max_tail_seconds=MAX_TAIL_SECONDS, tail_threshold=TAIL_THRESHOLD, timings=None):
+        self.processor = processor
+        self.fs = fs
+        self.block_size = block_size
+        self.flush_tail = flush_tail
+        self.max_tail_seconds = max_tail_seconds
+        self.tail_threshold = tail_threshold
+        self.timings = timings
+
+    def process(self, block, out=None):
+        if self.timings is None:
+            return self.processor.process(block, out=out)
+        start = time.perf_counter()
+        block = self.processor.process(block, out=out)
+        self.timings.record_block(time.perf_counter() - start, len(block), self.fs)
+        return block
+
+    def blocks(self, source, total_frames=None, progress=None, cancel=None):
+        # Every block is processed into the same buffer, so a caller that keeps
+        # a block past the next iteration has to copy it.
+        channels = None
+        frames_done = 0
+        buffer = None
+
+        for block in source:
+            if cancel is not None and cancel.is_set():
+                raise RenderCancelled()
+
+            block = to_float32(block)
+            block = block.reshape(len(block), -1)
+            channels = block.shape[1]
+            if buffer is None or buffer.shape[1] != channels or len(buffer) < len(block):
+                buffer = np.empty((max(len(block), self.block_size), channels), dtype=np.float32)
+
+            yield self.process(block, out=buffer[:len(block)])
+
+            frames_done += len(block)
+            if progress is not None and total_frames:
+                progress(min(frames_done / total_frames, 1))
+
+        if self.flush_tail and channels is not None:
+            yield from self.tail(channels, cancel)
+
+    def tail(self, channels, cancel=None):
+        silence = np.zeros((self.block_size, channels), dtype=np.float32)
+        max_blocks = int(np.ceil(self.max_tail_seconds * self.fs / self.block_size))
+        allowed_silence = getattr(self.processor, 'silence_gap', 0) + self.block_size
+
+        pending = []
+        silent_frames = 0
+        for _ in range(max_blocks):
+            if cancel is not None and cancel.is_set():
+                raise RenderCancelled()
+
+            out = self.process(silence)
+            if peak_level(out) > self.tail_threshold:
+                yield from pending
+                pending.clear()
+                silent_frames = 0
+                yield out
+            else:
+                pending.append(out.copy())
+                silent_frames += len(out)
+                if silent_frames >= allowed_silence:
+                    break
+
+    def render_to_file(self, source, output_path, channels, total_frames=None, progress=None, cancel=None,
+                       bit_depth=16, analyse_output=None):
+        with AudioWriter(output_path, self.fs, channels, bit_depth) as writer:
+            write = writer.write if self.timings is None else self.timings.timed(writer.write, 'write')
+            if analyse_output is not None and self.timings is not None:
+                analyse_output = self.timings.timed(analyse_output, 'analysis')
+            for block in self.blocks(source, total_frames, progress, cancel):
+                block = write(block)
+                if analyse_output is not None:
+                    analyse_output(block)
+
+        return writer.meter
+
+
+def peak_level(block):
+    # Same as np.abs(block).max() without the temporary array.
+    if block.size == 0:
+        return 0.0
+    return max(float(block.max()), -float(block.min()))
+
+
+class LevelMeter:
+    def __init__(self):
+        self.peak = 0.0
+        self.sum_squares = 0.0
+        self.samples = 0
+
+    def update(self, block):
+        if len(block) == 0:
+            return
+        self.peak = max(self.peak, peak_level(block))
+        self.sum_squares += float(np.vdot(block, block).real)
+        self.samples += block.size
+
+    @property
+    def rms(self):
+        return np.sqrt(self.sum_squares / self.samples) if self.samples else 0.0
+
+    @property
+    def peak_db(self):
+        return 20 * np.log10(self.peak) if self.peak > 0 else -np.inf
+
+    @property
+    def rms_db(self):
+        return 20 * np.log10(self.rms) if self.rms > 0 else -np.inf
+
+
+class AudioWriter:
+    SUBTYPES = {16: 'PCM_16', 24: 'PCM_24', 32: 'FLOAT'}
+
+    def __init__(self, path, fs, channels, bit_depth=16, gain=1.0):
+        import soundfile as sf
+
+        self.file = sf.SoundFile(path, 'w', int(fs), channels, subtype=self.SUBTYPES[bit_depth])
+        self.clip = bit_depth < 32
+        self.gain = gain
+        self.meter = LevelMeter()
+        self.buffer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+    def write(self, block, out=None):
+        # Gain and clipping go into out, or into a buffer reused across blocks;
+        # the returned block is only valid until the next write.
+        block = np.asarray(block, dtype=np.float32).reshape(len(block), -1)
+        if self.gain != 1.0 or self.clip or not block.flags.c_contiguous or out is not None:
+            if out is None:
+                if self.buffer is None or self.buffer.shape[1] != block.shape[1] or len(self.buffer) < len(block):
+                    self.buffer = np.empty(block.shape, dtype=np.float32)
+                out = self.buffer[:len(block)]
+            np.multiply(block, self.gain, out=out)
+            if self.clip:
+                np.clip(out, -1, 1, out=out)
+            block = out
+        self.meter.update(block)
+        self.file.write(block)
+        return block
+
+
+def iter_blocks(signal, block_size):
+    for i in range(0, len(signal), block_size):
+        yield signal[i:i+block_size]
+
+
+class DecodedFile:
+    # The subset of soundfile.SoundFile that AudioReader uses, for the formats
+    # only pedalboard can decode.
+    def __init__(self, path):
+        from pedalboard.io import AudioFile
+
+        self.file = AudioFile(path)
+        self.samplerate = self.file.samplerate
+        self.channels = self.file.num_channels
+        self.frames = self.file.frames
+
+    def close(self):
+        self.file.close()
+
+    def seek(self, frame):
+        self.file.seek(frame)
+
+    def read(self, frames=-1, dtype='float32', always_2d=True, out=None):
+        block = self.file.read(len(out) if out is not None else max(frames, 0)).T
+        if out is None:
+            return np.ascontiguousarray(block)
+        np.copyto(out[:len(block)], block)
+        return out[:len(block)]
+
+
+def open_audio_file(path):
+    import soundfile as sf
+
+    try:
+        return sf.SoundFile(path)
+    except sf.LibsndfileError:
+        return DecodedFile(path)
+
+
+class AudioReader:
+    def __init__(self, path):
+        self.file = open_audio_file(path)
+        self.fs = self.file.samplerate
+        self.channels = self.file.channels
+        self.frames = self.file.frames
+        self.frames_read = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+    @property
+    def duration(self):
+        return self.frames / self.fs
+
+    def blocks(self, block_size=DEFAULT_BLOCK_SIZE):
+        # Blocks are decoded as (frames, channels) float32 into one reused
+        # buffer, so a caller that keeps a block has to copy it.
+        buffer = np.empty((block_size, self.channels), dtype=np.float32)
+        while True:
+            block = self.file.read(dtype='float32', always_2d=True, out=buffer)
+            if len(block) == 0:
+                return
+            self.frames_read += len(block)
+            yield block
+
+    def read_region(self, start_frame, frames):
+        self.file.seek(min(max(start_frame, 0), self.frames))
+        block = self.file.read(max(frames, 0), dtype='float32', always_2d=True)
+        self.frames_read += len(block)
+        return block
+
+    def read_all(self):
+        return collect_blocks(self.blocks(), self.frames, self.channels)
+
+
+def collect_blocks(blocks, frames, channels):
+    # Copies the blocks into one array allocated for the expected length; only
+    # what goes past it, such as an effect tail, is gathered separately.
+    audio = np.empty((frames, channels), dtype=np.float32)
+    filled = 0
+    extra = []
+    for block in blocks:
+        count = min(len(block), frames - filled)
+        audio[filled:filled + count] = block[:count]
+        filled += count
+        if count < len(block):
+            extra.append(block[count:].copy())
+
+    if filled < frames or extra:
+        return np.concatenate([audio[:filled]] + extra)
+    return audio
+
+
+def read_audio(path):
+    with AudioReader(path) as reader:
+        return reader.fs, reader.read_all()
+
+
+def write_audio(path, fs, audio, block_size=DEFAULT_BLOCK_SIZE):
+    with AudioWriter(path, fs, audio.shape[1]) as writer:
+        for block in iter_blocks(audio, block_size):
+            writer.write(block)
+
+    return writer.meter
+
+
+def tap_blocks(source, callback):
+    for block in source:
+        callback(block)
+        yield block
+
+
+class WaveformPyramid:
+    def __init__(self, fs, channels, bucket=PYRAMID_BUCKET, offset=0.0):
+        self.fs = fs
+        self.channels = channels
+        self.bucket = bucket
+        self.offset = offset
+        self.frames = 0
+        self.pending = np.zeros((0, channels), dtype=np.float32)
+        self.chunks = []
+        self.levels = None
+
+    @classmethod
+    def from_signal(cls, signal, fs, bucket=PYRAMID_BUCKET, offset=0.0):
+        signal = np.asarray(signal)
+        signal = signal.reshape(len(signal), -1)
+        pyramid = cls(fs, signal.shape[1], bucket, offset)
+        pyramid.append(signal)
+        return pyramid
+
+    @classmethod
+    def from_envelope(cls, mins, maxs, fs, bucket, frames):
+        pyramid = cls(fs, mins.shape[1], bucket)
+        pyramid.frames = frames
+        pyramid.chunks = [(mins, maxs)]
+        return pyramid
+
+    @property
+    def duration(self):
+        return self.frames / self.fs
+
+    @property
+    def end(self):
+        return self.offset + self.duration
+
+    def append(self, block):
+        block = np.asarray(block, dtype=np.float32).reshape(len(block), -1)
+        self.frames += len(block)
+        self.levels = None
+        if len(self.pending):
+            fill = self.bucket - len(self.pending)
+            self.pending = np.concatenate([self.pending, block[:fill]])
+            block = block[fill:]
+            if len(self.pending) < self.bucket:
+                return
+            self.chunks.append((self.pending.min(axis=0, keepdims=True), self.pending.max(axis=0, keepdims=True)))
+
+        full = len(block) // self.bucket * self.bucket
+        if full:
+            buckets = block[:full].reshape(-1, self.bucket, self.channels)
+            self.chunks.append((buckets.min(axis=1), buckets.max(axis=1)))
+
+        self.pending = block[full:].copy()
+
+    def build(self):
+        chunks = list(self.chunks)
+        if len(self.pending):
+            chunks.append((self.pending.min(axis=0, keepdims=True), self.pending.max(axis=0, keepdims=True)))
+        if not chunks:
+            chunks.append((np.zeros((1, self.channels), np.float32), np.zeros((1, self.channels), np.float32)))
+
+        mins = np.concatenate([chunk[0] for chunk in chunks])
+        maxs = np.concatenate([chunk[1] for chunk in chunks])
+        self.chunks = [(mins, maxs)]
+
+        # Every level halves the resolution of the previous one, so the whole
+        # pyramid costs about twice as much memory as its finest level.
+        self.levels = [(mins, maxs)]
+        while len(mins) > 1:
+            if len(mins) % 2:
+                mins = np.concatenate([mins, mins[-1:]])
+                maxs = np.concatenate([maxs, maxs[-1:]])
+            mins = mins.reshape(-1, 2, self.channels).min(axis=1)
+            maxs = maxs.reshape(-1, 2, self.channels).max(axis=1)
+            self.levels.append((mins, maxs))
+
+    @property
+    def nbytes(self):
+        if self.levels is None:
+            self.build()
+        return sum(mins.nbytes + maxs.nbytes for mins, maxs in self.levels)
+
+    def peak_range(self):
+        if self.levels is None:
+            self.build()
+        mins, maxs = self.levels[-1]
+        return float(mins.min()), float(maxs.max())
+
+    def envelope(self, start, end, points):
+        if self.levels is None:
+            self.build()
+
+        first = max(int((start - self.offset) * self.fs), 0)
+        last = min(int(np.ceil((end - self.offset) * self.fs)), self.frames)
+        if last <= first:
+            empty = np.zeros((0, self.channels), np.float32)
+            return np.zeros(0), empty, empty
+
+        level = int(np.log2(max((last - first) / (max(points, 1) * self.bucket), 1)))
+        level = min(level, len(self.levels) - 1)
+        size = self.bucket << level
+        mins, maxs = self.levels[level]
+
+        first_bucket = first // size
+        last_bucket = -(-last // size)
+        times = self.offset + np.arange(first_bucket, last_bucket) * size / self.fs
+        return times, mins[first_bucket:last_bucket], maxs[first_bucket:last_bucket]
+
+
+class StreamingSpectrum:
+    def __init__(self, fs, total_frames=None, fft_size=SPECTRUM_FFT_SIZE, hop=SPECTRUM_HOP, bins=SPECTRUM_BINS,
+                 columns=SPECTRUM_COLUMNS):
+        self.fs = fs
+        self.fft_size = fft_size
+        self.hop = hop
+        self.bins = bins
+        self.bin_group = fft_size // 2 // bins
+        self.max_columns = columns
+        self.window = np.hanning(fft_size).astype(np.float32)
+        # Scales power so that a full-scale sine reads 0 dB.
+        self.scale = 4 / float(self.window.sum()) ** 2
+        # Averages over short axes are much faster as matrix products.
+        self.mix = None
+        self.band = np.full(self.bin_group, 1 / self.bin_group)
+
+        self.pending = 0
+        self.signal = np.zeros(fft_size, dtype=np.float32)
+        self.windowed = np.zeros((0, fft_size), dtype=np.float32)
+        self.power_sum = np.zeros(fft_size // 2 + 1)
+        self.frames = 0
+
+        # Spectrogram columns are sums of column_size STFT frames, so that a
+        # long file never keeps more than about max_columns columns.
+        expected = (total_frames or 0) // hop
+        self.column_size = max(-(-expected // columns), 1)
+        self.sums = np.zeros((0, bins), dtype=np.float32)
+        self.weights = np.zeros(0, dtype=np.int64)
+        self.partial = np.zeros((0, bins), dtype=np.float32)
+
+    def append(self, block):
+        # The mono mix is appended after the samples left over from the
+        # previous block in a buffer that only grows when a larger block comes.
+        block = np.asarray(block, dtype=np.float32).reshape(len(block), -1)
+        length = self.pending + len(block)
+        if len(self.signal) < length:
+            signal = np.empty(length, dtype=np.float32)
+            signal[:self.pending] = self.signal[:self.pending]
+            self.signal = signal
+        signal = self.signal[:length]
+        if self.mix is None or len(self.mix) != block.shape[1]:
+            self.mix = np.full(block.shape[1], 1 / block.shape[1], dtype=np.float32)
+        np.matmul(block, self.mix, out=signal[self.pending:])
+
+        count = (length - self.fft_size) // self.hop + 1 if length >= self.fft_size else 0
+        if count:
+            if len(self.windowed) < count:
+                self.windowed = np.empty((count, self.fft_size), dtype=np.float32)
+            windowed = self.windowed[:count]
+            frames = np.lib.stride_tricks.sliding_window_view(signal, self.fft_size)[::self.hop][:count]
+            np.multiply(frames, self.window, out=windowed)
+            power = np.abs(np.fft.rfft(windowed, axis=1))
+            np.square(power, out=power)
+            power *= self.scale
+            self.power_sum += power.sum(axis=0)
+            self.frames += count
+            self.add_rows((power[:, :-1].reshape(count, self.bins, self.bin_group) @ self.band).astype(np.float32))
+
+        self.pending = length - count * self.hop
+        self.signal[:self.pending] = signal[count * self.hop:]
+
+    def add_rows(self, rows):
+        rows = np.concatenate([self.partial, rows])
+        full = len(rows) // self.column_size * self.column_size
+        if full:
+            sums = rows[:full].reshape(-1, self.column_size, self.bins).sum(axis=1)
+            self.sums = np.concatenate([self.sums, sums])
+            self.weights = np.concatenate([self.weights, np.full(len(sums), self.column_size)])
+        self.partial = rows[full:]
+
+        if len(self.sums) > 2 * self.max_columns:
+            paired = len(self.sums) // 2 * 2
+            self.sums = np.concatenate([self.sums[:paired].reshape(-1, 2, self.bins).sum(axis=1),
+                                        self.sums[paired:]])
+            self.weights = np.concatenate([self.weights[:paired].reshape(-1, 2).sum(axis=1), self.weights[paired:]])
+            self.column_size *= 2
+
+    @property
+    def nbytes(self):
+        return (self.sums.nbytes + self.weights.nbytes + self.partial.nbytes + self.power_sum.nbytes +
+                self.signal.nbytes + self.windowed.nbytes)
+
+    def __getstate__(self):
+        # The scratch buffers are not worth storing in the cache.
+        state = dict(self.__dict__)
+        state['signal'] = self.signal[:self.pending].copy()
+        state['windowed'] = self.windowed[:0]
+        return state
+
+    def spectrogram(self):
+        sums, weights = self.sums, self.weights
+        if len(self.partial):
+            sums = np.concatenate([sums, self.partial.sum(axis=0, keepdims=True)])
+            weights = np.concatenate([weights, [len(self.partial)]])
+        times = np.concatenate([[0], np.cumsum(weights)]) * self.hop / self.fs
+        freqs = np.arange(self.bins + 1) * self.bin_group * self.fs / self.fft_size
+        power = sums / np.maximum(weights, 1)[:, None]
+        return times, freqs, 10 * np.log10(power.T + 1e-12)
+
+    def average(self):
+        freqs = np.fft.rfftfreq(self.fft_size, 1 / self.fs)
+        return freqs, 10 * np.log10(self.power_sum / max(self.frames, 1) + 1e-12)
+
+
+def fan_out(*callbacks):
+    def analyse(block):
+        for callback in callbacks:
+            callback(block)
+    return analyse
+
+
+class RenderTimings:
+    # Wall time per render stage plus the DSP time of every block; the block
+    # times feed the latency histogram and the real-time budget per block.
+    def __init__(self):
+        self.stages = OrderedDict()
+        self.block_times = []
+        self.block_budgets = []
+        self.start_time = time.perf_counter()
+        self.render_time = None
+
+    def add(self, stage, seconds, calls=1):
+        totals = self.stages.setdefault(stage, [0.0, 0])
+        totals[0] += seconds
+        totals[1] += calls
+
+    @contextmanager
+    def measure(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def timed(self, callback, stage):
+        def timed_callback(*args, **kwargs):
+            start = time.perf_counter()
+            result = callback(*args, **kwargs)
+            self.add(stage, time.perf_counter() - start)
+            return result
+        return timed_callback
+
+    def timed_blocks(self, source, stage):
+        # Charges the time spent producing each block to the stage, but not
+        # what the consumer does with it between iterations.
+        source = iter(source)
+        while True:
+            start = time.perf_counter()
+            block = next(source, None)
+            self.add(stage, time.perf_counter() - start)
+            if block is None:
+                return
+            yield block
+
+    def record_block(self, seconds, frames, fs):
+        self.add('dsp', seconds)
+        self.block_times.append(seconds)
+        self.block_budgets.append(frames / fs)
+
+    def finish(self):
+        self.render_time = time.perf_counter() - self.start_time
+        return self
+
+    def to_dict(self):
+        return {'stages': list(self.stages.items()), 'block_times': self.block_times,
+                'block_budgets': self.block_budgets, 'render_time': self.render_time}
+
+    @classmethod
+    def from_dict(cls, state):
+        timings = cls()
+        timings.stages = OrderedDict((stage, list(totals)) for stage, totals in state['stages'])
+        timings.block_times = list(state['block_times'])
+        timings.block_budgets = list(state['block_budgets'])
+        timings.render_time = state['render_time']
+        return timings
+
+    def histogram(self, edges_ms=LATENCY_HISTOGRAM_MS):
+        edges = np.append(np.asarray(edges_ms, dtype=float), np.inf)
+        counts = np.bincount(np.searchsorted(edges, np.asarray(self.block_times) * 1000), minlength=len(edges))
+        return [(float(edge), int(count)) for edge, count in zip(edges, counts)]
+
+    def summary(self):
+        render_time = self.render_time if self.render_time is not None else time.perf_counter() - self.start_time
+        total = max(render_time, sum(seconds for seconds, _ in self.stages.values()), 1e-12)
+        stages = [{'stage': stage, 'seconds': seconds, 'calls': calls, 'share': seconds / total}
+                  for stage, (seconds, calls) in self.stages.items()]
+
+        block_ms = np.asarray(self.block_times) * 1000
+        blocks = {'count': len(block_ms)}
+        if len(block_ms):
+            load = np.asarray(self.block_times) / np.asarray(self.block_budgets)
+            p50, p95, p99 = np.percentile(block_ms, [50, 95, 99])
+            blocks.update(mean_ms=float(block_ms.mean()), p50_ms=float(p50), p95_ms=float(p95),
+                          p99_ms=float(p99), max_ms=float(block_ms.max()), max_load=float(load.max()),
+                          realtime_factor=float(sum(self.block_budgets) / max(block_ms.sum() / 1000, 1e-12)))
+
+        return {
+            'render_time': render_time,
+            'stages': stages,
+            'blocks': blocks,
+            'histogram': [{'up_to_ms': edge if np.isfinite(edge) else None, 'count': count}
+                          for edge, count in self.histogram()]
+        }
+
+    def format(self):
+        summary = self.summary()
+        parts = [f"{row['stage']} {row['seconds'] * 1000:.0f} ms" for row in summary['stages']]
+        blocks = summary['blocks']
+        if blocks['count']:
+            parts.append(f"blok p50 {blocks['p50_ms']:.2f} ms, p99 {blocks['p99_ms']:.2f} ms, "
+                         f"maks. {blocks['max_ms']:.2f} ms")
+        return ", ".join(parts)
+
+    def write(self, path):
+        summary = self.summary()
+        if os.path.splitext(path)[1].lower() == '.csv':
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['section', 'name', 'value', 'calls', 'share'])
+                writer.writerow(['total', 'render_time', summary['render_time'], '', ''])
+                for row in summary['stages']:
+                    writer.writerow(['stage', row['stage'], row['seconds'], row['calls'], row['share']])
+                for name, value in summary['blocks'].items():
+                    writer.writerow(['blocks', name, value, '', ''])
+                for row in summary['histogram']:
+                    writer.writerow(['histogram_ms', row['up_to_ms'], row['count'], '', ''])
+        else:
+            with open(path, 'w') as f:
+                json.dump(summary, f, indent=2)
+
+
+def profile_call(profile_path, function, *args, **kwargs):
+    import cProfile
+
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(function, *args, **kwargs)
+    finally:
+        profiler.dump_stats(profile_path)
+
+
+def profile_report(profile_path, lines=PROFILE_LINES):
+    import io
+    import pstats
+
+    stream = io.StringIO()
+    pstats.Stats(profile_path, stream=stream).strip_dirs().sort_stats('cumulative').print_stats(lines)
+    return stream.getvalue()
+
+
+class RenderCancelled(Exception):
+    pass
+
+
+def create_processor(effect, params, fs):
+    if effect == "Delay":
+        return DelayLine(fs, **params)
+    if effect in BLOCK_EFFECTS:
+        return BLOCK_EFFECTS[effect](fs, **params)
+
+    import pedalboard
+
+    if effect in BOARD_EFFECTS:
+        board = pedalboard.Pedalboard([getattr(pedalboard, effect)(**params)])
+    else:
+        board = pedalboard.Pedalboard([])
+
+    return BoardProcessor(board, fs)
+
+
+def create_chain_processor(chain, fs):
+    if len(chain) == 1:
+        return create_processor(*chain[0], fs)
+    return ChainProcessor([create_processor(effect, params, fs) for effect, params in chain])
+
+
+def normalization_gain(normalize, input_level, output_level):
+    if output_level.peak == 0:
+        return 1.0
+    if normalize == "match_input":
+        return input_level.peak / output_level.peak
+    if normalize == "peak":
+        return 10 ** (NORMALIZE_PEAK_DB / 20) / output_level.peak
+    raise ValueError(f"Nieznany tryb normalizacji: {normalize}")
+
+
+def copy_with_gain(source_path, output_path, gain, block_size=DEFAULT_BLOCK_SIZE, cancel=None,
+                   analyse_output=None, timings=None):
+    if timings is None:
+        timings = RenderTimings()
+    if analyse_output is not None:
+        analyse_output = timings.timed(analyse_output, 'analysis')
+
+    with AudioReader(source_path) as reader, AudioWriter(output_path, reader.fs, reader.channels, gain=gain) as writer:
+        write = timings.timed(writer.write, 'write')
+        for block in timings.timed_blocks(reader.blocks(block_size), 'decode'):
+            if cancel is not None and cancel.is_set():
+                raise RenderCancelled()
+            block = write(block)
+            if analyse_output is not None:
+                analyse_output(block)
+
+    return writer.meter
+
+
+def process_stream(reader, chain, output_path, block_size=DEFAULT_BLOCK_SIZE,
+                   progress=None, cancel=None, normalize=None, analyse_input=None, analyse_output=None,
+                   timings=None):
+    if timings is None:
+        timings = RenderTimings()
+    with timings.measure('setup'):
+        processor = create_chain_processor(chain, reader.fs)
+    renderer = StreamingRenderer(processor, reader.fs, block_size=block_size, timings=timings)
+
+    input_level = LevelMeter()
+    source = timings.timed_blocks(reader.blocks(block_size), 'decode')
+    source = tap_blocks(source, timings.timed(input_level.update, 'analysis'))
+    if analyse_input is not None:
+        source = tap_blocks(source, timings.timed(analyse_input, 'analysis'))
+
+    start_time = time.time()
+    if normalize is None:
+        output_level = renderer.render_to_file(source, output_path, reader.channels, reader.frames,
+                                               progress, cancel, analyse_output=analyse_output)
+        gain = 1.0
+    else:
+        # The first pass goes to a float file so that nothing clips before the
+        # gain is known; the second pass only rescales and encodes it.
+        render_path = os.path.splitext(output_path)[0] + '.part.wav'
+        try:
+            render_level = renderer.render_to_file(source, render_path, reader.channels, reader.frames,
+                                                   progress, cancel, bit_depth=32)
+            gain = normalization_gain(normalize, input_level, render_level)
+            output_level = copy_with_gain(render_path, output_path, gain, block_size, cancel, analyse_output,
+                                          timings)
+        finally:
+            if os.path.exists(render_path):
+                os.remove(render_path)
+
+    return {
+        'elapsed_time': time.time() - start_time,
+        'gain': gain,
+        'input_level': input_level,
+        'output_level': output_level,
+        'timings': timings.finish()
+    }
+
+
+def process_file(file_path, chain, output_path, block_size=DEFAULT_BLOCK_SIZE,
+                 progress=None, cancel=None, normalize=None, timings=None):
+    with AudioReader(file_path) as reader:
+        stats = process_stream(reader, chain, output_path, block_size, progress, cancel, normalize,
+                               timings=timings)
+
+    stats['fs'] = reader.fs
+    stats['frames'] = reader.frames_read
+    return stats
+
+
+def chain_key(content_hash, chain, fs, normalize=None):
+    stages = [[effect, sorted((name, round(value, CACHE_PARAM_DIGITS)) for name, value in params.items())]
+              for effect, params in chain]
+    key = json.dumps([CACHE_VERSION, content_hash, stages, fs, normalize])
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def stage_key(content_hash, chain, fs):
+    return 'stage-' + chain_key(content_hash, chain, fs)
+
+
+def decoded_key(content_hash):
+    return f'decoded-{CACHE_VERSION}-{content_hash}'
+
+
+def spectrum_key(content_hash):
+    return f'spectrum-{CACHE_VERSION}-{content_hash}'
+
+
+def entry_size(entry):
+    return sum(value.nbytes for value in entry.values()
+               if isinstance(value, (np.ndarray, WaveformPyramid, StreamingSpectrum)))
+
+
+class RenderCache:
+    def __init__(self, max_bytes=CACHE_MEMORY_BYTES, folder=CACHE_FOLDER, max_disk_bytes=CACHE_DISK_BYTES):
+        self.max_bytes = max_bytes
+        self.folder = folder
+        self.max_disk_bytes = max_disk_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hashes = {}
+        self.lock = threading.Lock()
+
+    def content_hash(self, path):
+        stat = os.stat(path)
+        file_id = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            if file_id in self.hashes:
+                return self.hashes[file_id]
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+                digest.update(chunk)
+
+        with self.lock:
+            self.hashes[file_id] = digest.hexdigest()
+        return digest.hexdigest()
+
+    def fits(self, nbytes):
+        return nbytes <= self.max_bytes
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+
+        path = self.disk_path(key)
+        try:
+            with open(path, 'rb') as f:
+                entry = pickle.load(f)
+            os.utime(path)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None
+
+        self.remember(key, entry)
+        return entry
+
+    def put(self, key, entry, persist=True):
+        self.remember(key, entry)
+        if not persist or self.folder is None or self.max_disk_bytes <= 0:
+            return
+
+        # Each put writes its own temporary file, so threads storing the same
+        # key at once do not replace each other's half-written file.
+        os.makedirs(self.folder, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.folder, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self.disk_path(key))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        self.evict_disk()
+
+    def remember(self, key, entry):
+        size = entry_size(entry)
+        if not self.fits(size):
+            return
+
+        with self.lock:
+            if key in self.entries:
+                self.size -= entry_size(self.entries.pop(key))
+            self.entries[key] = entry
+            self.size += size
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= entry_size(evicted)
+
+    def disk_path(self, key):
+        return os.path.join(self.folder, key + '.pkl') if self.folder is not None else ''
+
+    def evict_disk(self):
+        files = []
+        for entry in os.scandir(self.folder):
+            if entry.name.endswith('.pkl'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+
+        # Another thread may be evicting at the same time.
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def decode_cached(file_path, cache):
+    key = decoded_key(cache.content_hash(file_path))
+    entry = cache.get(key)
+    if entry is None:
+        fs, audio = read_audio(file_path)
+        entry = {'fs': fs, 'audio': audio}
+        cache.put(key, entry)
+    return entry['fs'], entry['audio']
+
+
+def render_stages(fs, audio, chain, content_hash, cache, block_size=DEFAULT_BLOCK_SIZE, progress=None,
+                  cancel=None, timings=None):
+    if timings is None:
+        timings = RenderTimings()
+
+    # Resume from the longest chain prefix whose output is still cached, so
+    # changing a late stage does not re-render the stages before it.
+    first_stage = 0
+    for count in range(len(chain), 0, -1):
+        with timings.measure('cache'):
+            entry = cache.get(stage_key(content_hash, chain[:count], fs))
+        if entry is not None:
+            first_stage, audio = count, entry['audio']
+            break
+
+    stages_to_run = len(chain) - first_stage
+    for index in range(first_stage, len(chain)):
+        effect, params = chain[index]
+        with timings.measure('setup'):
+            processor = create_processor(effect, params, fs)
+        renderer = StreamingRenderer(processor, fs, block_size=block_size, timings=timings)
+
+        stage_progress = None
+        if progress is not None:
+            stage_progress = lambda fraction, done=index - first_stage: progress((done + fraction) / stages_to_run)
+
+        audio = collect_blocks(renderer.blocks(iter_blocks(audio, block_size), len(audio), stage_progress, cancel),
+                               len(audio), audio.shape[1])
+        with timings.measure('cache'):
+            cache.put(stage_key(content_hash, chain[:index + 1], fs), {'fs': fs, 'audio': audio}, persist=False)
+
+    return audio, first_stage
+
+
+def stream_render_file(file_path, chain, output_path, block_size=DEFAULT_BLOCK_SIZE,
+                       progress=None, cancel=None, normalize="match_input", timings=None):
+    with AudioReader(file_path) as reader:
+        pyramid_original = WaveformPyramid(reader.fs, reader.channels)
+        pyramid_processed = WaveformPyramid(reader.fs, reader.channels)
+        spectrum_original = StreamingSpectrum(reader.fs, reader.frames)
+        spectrum_processed = StreamingSpectrum(reader.fs, reader.frames)
+        stats = process_stream(reader, chain, output_path, block_size, progress, cancel, normalize,
+                               analyse_input=fan_out(pyramid_original.append, spectrum_original.append),
+                               analyse_output=fan_out(pyramid_processed.append, spectrum_processed.append),
+                               timings=timings)
+
+    return {
+        'fs': reader.fs,
+        'pyramid_original': pyramid_original,
+        'pyramid_processed': pyramid_processed,
+        'spectrum_original': spectrum_original,
+        'spectrum_processed': spectrum_processed,
+        'output_level': stats['output_level'],
+        'output_path': output_path,
+        'elapsed_time': stats['elapsed_time'],
+        'cached': False,
+        'first_stage': 0,
+        'timings': stats['timings']
+    }
+
+
+def render_file(file_path, chain, output_path, block_size=DEFAULT_BLOCK_SIZE,
+                progress=None, cancel=None, normalize="match_input", cache=None, timings=None):
+    start_time = time.time()
+    if timings is None:
+        timings = RenderTimings()
+
+    decoded = None
+    if cache is not None:
+        with timings.measure('cache'):
+            content_hash = cache.content_hash(file_path)
+            decoded = cache.get(decoded_key(content_hash))
+        if decoded is None:
+            with AudioReader(file_path) as reader:
+                # Checkpoints keep whole buffers per stage; files too long for
+                # the cache are streamed through the chain in one pass instead.
+                if cache.fits(reader.frames * reader.channels * 4 * 3):
+                    with timings.measure('decode'):
+                        decoded = {'fs': reader.fs, 'audio': reader.read_all()}
+                    with timings.measure('cache'):
+                        cache.put(decoded_key(content_hash), decoded)
+
+    if decoded is None:
+        return stream_render_file(file_path, chain, output_path, block_size, progress, cancel, normalize, timings)
+
+    fs, audio = decoded['fs'], decoded['audio']
+    key = chain_key(content_hash, chain, fs, normalize)
+    with timings.measure('cache'):
+        cached = cache.get(key)
+    if cached is not None:
+        with timings.measure('write'):
+            write_audio(output_path, fs, cached['audio'], block_size)
+        return dict(cached, output_path=output_path, elapsed_time=time.time() - start_time, cached=True,
+                    first_stage=len(chain), timings=timings.finish())
+
+    rendered, first_stage = render_stages(fs, audio, chain, content_hash, cache, block_size, progress, cancel,
+                                          timings)
+
+    with timings.measure('analysis'):
+        input_level = LevelMeter()
+        input_level.update(audio)
+        rendered_level = LevelMeter()
+        rendered_level.update(rendered)
+    gain = normalization_gain(normalize, input_level, rendered_level) if normalize is not None else 1.0
+
+    # The input spectrum only depends on the file, so it is kept across
+    # renders of different chains.
+    with timings.measure('cache'):
+        spectrum_original = cache.get(spectrum_key(content_hash))
+    if spectrum_original is None:
+        with timings.measure('analysis'):
+            spectrum_original = {'spectrum': StreamingSpectrum(fs, len(audio))}
+            for block in iter_blocks(audio, block_size):
+                spectrum_original['spectrum'].append(block)
+        with timings.measure('cache'):
+            cache.put(spectrum_key(content_hash), spectrum_original)
+
+    # The output is scaled and clipped straight into the array that is cached.
+    pyramid_processed = WaveformPyramid(fs, rendered.shape[1])
+    spectrum_processed = StreamingSpectrum(fs, len(rendered))
+    analyse_output = timings.timed(fan_out(pyramid_processed.append, spectrum_processed.append), 'analysis')
+    output = np.empty(rendered.shape, dtype=np.float32)
+    with AudioWriter(output_path, fs, rendered.shape[1], gain=gain) as writer:
+        write = timings.timed(writer.write, 'write')
+        for start in range(0, len(rendered), block_size):
+            analyse_output(write(rendered[start:start + block_size], out=output[start:start + block_size]))
+
+    with timings.measure('analysis'):
+        pyramid_original = WaveformPyramid.from_signal(audio, fs)
+
+    result = {
+        'fs': fs,
+        'audio': output,
+        'pyramid_original': pyramid_original,
+        'pyramid_processed': pyramid_processed,
+        'spectrum_original': spectrum_original['spectrum'],
+        'spectrum_processed': spectrum_processed,
+        'output_level': writer.meter
+    }
+    with timings.measure('cache'):
+        cache.put(key, result)
+
+    return dict(result, output_path=output_path, elapsed_time=time.time() - start_time, cached=False,
+                first_stage=first_stage, timings=timings.finish())
+
+
+def render_preview(audio, fs, chain, block_size=DEFAULT_BLOCK_SIZE):
+    renderer = StreamingRenderer(create_chain_processor(chain, fs), fs, block_size=block_size, flush_tail=False)
+    processed = collect_blocks(renderer.blocks(iter_blocks(audio, block_size)), len(audio), audio.shape[1])
+
+    input_level = LevelMeter()
+    input_level.update(audio)
+    output_level = LevelMeter()
+    output_level.update(processed)
+    gain = normalization_gain("match_input", input_level, output_level)
+    processed *= gain
+    return np.clip(processed, -1, 1, out=processed)
+
+
+def sounddevice_stream(kind):
+    # PortAudio is only loaded once a device stream is actually opened.
+    import sounddevice as sd
+
+    return getattr(sd, kind)
+
+
+def default_input_samplerate():
+    import sounddevice as sd
+
+    return sd.query_devices(None, 'input')['default_samplerate']
+
+
+class LiveMonitor:
+    def __init__(self, effect, params, fs, block_size=DEFAULT_LIVE_BLOCK_SIZE, input_channels=1,
+                 output_channels=2, stream_factory=None):
+        self.effect = effect
+        self.processor = create_processor(effect, params, fs)
+        self.fs = fs
+        self.block_size = block_size
+        self.input_channels = input_channels
+        self.output_channels = output_channels
+        self.stream_factory = stream_factory
+        self.stream = None
+        self.buffer = np.zeros((block_size, input_channels), dtype=np.float32)
+
+        self.callbacks = 0
+        self.input_overflows = 0
+        self.output_underflows = 0
+        self.late_callbacks = 0
+        self.last_callback_time = 0.0
+        self.max_callback_time = 0.0
+
+    def start(self):
+        stream_factory = self.stream_factory or sounddevice_stream('Stream')
+        self.stream = stream_factory(samplerate=self.fs, blocksize=self.block_size,
+                                     channels=(self.input_channels, self.output_channels),
+                                     dtype='float32', latency='low', callback=self.callback)
+        self.stream.start()
+
+    def stop(self):
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+
+    def update(self, effect, params):
+        # A new processor is built on the calling thread and swapped in with a
+        # single attribute store, so the audio thread never sees it half-made.
+        if effect != self.effect or not self.processor.update(params):
+            self.processor = create_processor(effect, params, self.fs)
+            self.effect = effect
+
+    def callback(self, indata, outdata, frames, time_info, status):
+        started = time.perf_counter()
+
+        if status.input_overflow:
+            self.input_overflows += 1
+        if status.output_underflow:
+            self.output_underflows += 1
+
+        outdata[:] = self.processor.process(indata, out=self.buffer[:frames])
+
+        self.callbacks += 1
+        self.last_callback_time = time.perf_counter() - started
+        if self.last_callback_time > self.max_callback_time:
+            self.max_callback_time = self.last_callback_time
+        if self.last_callback_time > frames / self.fs:
+            self.late_callbacks += 1
+
+    def stats(self):
+        input_latency, output_latency = self.stream.latency if self.stream is not None else (0.0, 0.0)
+        return {
+            'callbacks': self.callbacks,
+            'xruns': self.input_overflows + self.output_underflows,
+            'input_overflows': self.input_overflows,
+            'output_underflows': self.output_underflows,
+            'late_callbacks': self.late_callbacks,
+            'max_callback_ms': self.max_callback_time * 1000,
+            'round_trip_ms': (input_latency + output_latency + self.block_size / self.fs) * 1000
+        }
+
+
+class SimulatedStatus:
+    def __init__(self, input_overflow=False, output_underflow=False):
+        self.input_overflow = input_overflow
+        self.output_underflow = output_underflow
+
+    def __bool__(self):
+        return self.input_overflow or self.output_underflow
+
+
+class SimulatedStream:
+    def __init__(self, samplerate, blocksize, channels, dtype, latency, callback):
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.channels = channels
+        self.dtype = dtype
+        self.callback = callback
+        self.latency = (0.0, 0.0)
+        self.active = False
+
+    def start(self):
+        self.active = True
+
+    def stop(self):
+        self.active = False
+
+    def close(self):
+        self.active = False
+
+    def feed(self, signal, status=None):
+        signal = np.asarray(signal, dtype=self.dtype).reshape(len(signal), -1)
+        output = np.zeros((len(signal), self.channels[1]), dtype=self.dtype)
+        indata = np.zeros((self.blocksize, self.channels[0]), dtype=self.dtype)
+        outdata = np.zeros((self.blocksize, self.channels[1]), dtype=self.dtype)
+
+        for i in range(0, len(signal), self.blocksize):
+            frames = min(self.blocksize, len(signal) - i)
+            indata[:frames] = signal[i:i+frames]
+            indata[frames:] = 0
+            self.callback(indata, outdata, self.blocksize, None, status or SimulatedStatus())
+            output[i:i+frames] = outdata[:frames]
+
+        return output
+
+
+class PlaybackEngine:
+    def __init__(self, fs, channels=2, block_size=PLAYBACK_BLOCK_SIZE, crossfade=CROSSFADE_SECONDS,
+                 stream_factory=None):
+        self.fs = fs
+        self.channels = channels
+        self.block_size = block_size
+        self.fade_frames = max(int(crossfade * fs), 1)
+        self.stream_factory = stream_factory
+        self.stream = None
+
+        self.sources = {}
+        self.current = None
+        self.previous = None
+        self.fade_done = 0
+        self.position = 0
+        self.playing = False
+        self.loop = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        stream_factory = self.stream_factory or sounddevice_stream('OutputStream')
+        self.stream = stream_factory(samplerate=self.fs, blocksize=self.block_size, channels=self.channels,
+                                     dtype='float32', callback=self.callback)
+        self.stream.start()
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+
+    @property
+    def position_seconds(self):
+        return self.position / self.fs
+
+    def length(self):
+        return max((offset + len(audio) for offset, audio in self.sources.values()), default=0)
+
+    def set_source(self, name, audio, offset=0.0):
+        audio = to_float32(np.asarray(audio)).reshape(len(audio), -1)[:, :self.channels]
+        with self.lock:
+            self.sources[name] = (int(round(offset * self.fs)), audio)
+
+    def remove_source(self, name):
+        with self.lock:
+            self.sources.pop(name, None)
+            if self.current == name:
+                self.current = None
+                self.playing = False
+            if self.previous == name:
+                self.previous = None
+
+    def play(self, name):
+        with self.lock:
+            if self.playing and self.current is not None and self.current != name:
+                self.previous = self.current
+                self.fade_done = 0
+            elif not self.playing and self.loop is None and self.position >= self.length():
+                self.position = 0
+            self.current = name
+            self.playing = True
+
+    def pause(self):
+        with self.lock:
+            self.playing = False
+            self.previous = None
+
+    def seek(self, seconds):
+        with self.lock:
+            self.position = max(int(seconds * self.fs), 0)
+            if self.loop is not None and not self.loop[0] <= self.position < self.loop[1]:
+                self.position = self.loop[0]
+
+    def set_loop(self, start=None, end=None):
+        with self.lock:
+            if start is None or end is None or end <= start:
+                self.loop = None
+                return
+            self.loop = (int(start * self.fs), int(end * self.fs))
+            if not self.loop[0] <= self.position < self.loop[1]:
+                self.position = self.loop[0]
+
+    def read(self, name, positions, out):
+        out.fill(0)
+        if name not in self.sources:
+            return
+        offset, audio = self.sources[name]
+        local = positions - offset
+        valid = (local >= 0) & (local < len(audio))
+        out[valid] = audio[local[valid]]
+
+    def callback(self, outdata, frames, time_info, status):
+        with self.lock:
+            if not self.playing or self.current is None:
+                outdata.fill(0)
+                return
+
+            positions = self.position + np.arange(frames)
+            if self.loop is not None:
+                start, end = self.loop
+                positions = start + (positions - start) % (end - start)
+
+            self.read(self.current, positions, outdata)
+
+            # Switching keeps the position and fades the old source out over
+            # fade_frames instead of restarting the new one from zero.
+            if self.previous is not None:
+                fade_in = np.clip((self.fade_done + np.arange(1, frames + 1)) / self.fade_frames, 0, 1)[:, None]
+                previous = np.empty_like(outdata)
+                self.read(self.previous, positions, previous)
+                outdata *= fade_in
+                outdata += previous * (1 - fade_in)
+                self.fade_done += frames
+                if self.fade_done >= self.fade_frames:
+                    self.previous = None
+
+            self.position = int(positions[-1]) + 1
+            if self.loop is not None and self.position >= self.loop[1]:
+                self.position = self.loop[0]
+            elif self.loop is None and self.position >= self.length():
+                self.playing = False
+
+
+class RingBuffer:
+    # Single producer (the audio callback) and single consumer (the writer
+    # thread). Each side only advances its own counter, so no lock is needed.
+    def __init__(self, frames, channels, dtype=np.float32):
+        self.data = np.zeros((frames, channels), dtype=dtype)
+        self.capacity = frames
+        self.write_count = 0
+        self.read_count = 0
+        self.dropped = 0
+
+    def available(self):
+        return self.write_count - self.read_count
+
+    def write(self, block):
+        count = min(len(block), self.capacity - self.available())
+        self.dropped += len(block) - count
+
+        start = self.write_count % self.capacity
+        first = min(count, self.capacity - start)
+        self.data[start:start + first] = block[:first]
+        self.data[:count - first] = block[first:count]
+
+        self.write_count += count
+        return count
+
+    def read(self, out):
+        count = min(len(out), self.available())
+
+        start = self.read_count % self.capacity
+        first = min(count, self.capacity - start)
+        out[:first] = self.data[start:start + first]
+        out[first:count] = self.data[:count - first]
+
+        self.read_count += count
+        return count
+
+
+class Recorder:
+    def __init__(self, path, fs, channels=1, buffer_seconds=RECORDING_BUFFER_SECONDS, stream_factory=None):
+        self.path = path
+        self.fs = fs
+        self.channels = channels
+        self.ring = RingBuffer(int(buffer_seconds * fs), channels)
+        self.chunk = np.zeros((RECORDING_WRITE_FRAMES, channels), dtype=np.float32)
+        self.stream_factory = stream_factory
+        self.stream = None
+        self.file = None
+        self.writer_thread = None
+        self.stopping = threading.Event()
+        self.frames_written = 0
+        self.overflows = 0
+
+    @property
+    def dropped_frames(self):
+        return self.ring.dropped
+
+    @property
+    def duration(self):
+        return self.frames_written / self.fs
+
+    def start(self):
+        import soundfile as sf
+
+        # The stream is opened first, so a missing input device leaves no file
+        # or writer thread behind; if it then fails to start, both are undone.
+        stream_factory = self.stream_factory or sounddevice_stream('InputStream')
+        self.stream = stream_factory(samplerate=self.fs, channels=self.channels, dtype='float32',
+                                     callback=self.callback)
+        try:
+            self.file = sf.SoundFile(self.path, 'w', int(self.fs), self.channels, subtype='FLOAT')
+            self.writer_thread = threading.Thread(target=self.writer_loop, daemon=True)
+            self.writer_thread.start()
+            self.stream.start()
+        except BaseException:
+            self.stop()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            raise
+
+    def callback(self, indata, frames, time_info, status):
+        if status:
+            self.overflows += 1
+        self.ring.write(indata)
+
+    def writer_loop(self):
+        while True:
+            stopping = self.stopping.is_set()
+            count = self.ring.read(self.chunk)
+            if count:
+                self.file.write(self.chunk[:count])
+                self.frames_written += count
+            elif stopping:
+                return
+            else:
+                self.stopping.wait(RECORDING_POLL_SECONDS)
+
+    def stop(self):
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+
+        self.stopping.set()
+        if self.writer_thread is not None:
+            self.writer_thread.join()
+        if self.file is not None:
+            self.file.close()
+
+
+LIBRARY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS folders (path TEXT PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    fs INTEGER,
+    channels INTEGER,
+    frames INTEGER,
+    peak REAL,
+    bucket INTEGER,
+    thumbnail BLOB,
+    error TEXT
+);
+"""
+
+
+def scan_audio_files(folder, recursive=True):
+    # Subfolders are entered only when recursive, and never hidden ones or
+    # the app's own output and cache folders.
+    pending = [folder]
+    while pending:
+        try:
+            entries = list(os.scandir(pending.pop()))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if (recursive and not entry.name.startswith('.')
+                        and os.path.abspath(entry.path) not in LIBRARY_SKIP_FOLDERS):
+                    pending.append(entry.path)
+            elif entry.name.lower().endswith(AUDIO_EXTENSIONS) and entry.is_file():
+                stat = entry.stat()
+                yield os.path.abspath(entry.path), stat.st_mtime_ns, stat.st_size
+
+
+def analyse_audio_file(path, points=THUMBNAIL_POINTS):
+    with AudioReader(path) as reader:
+        bucket = max(-(-reader.frames // points), 1)
+        pyramid = WaveformPyramid(reader.fs, reader.channels, bucket)
+        level = LevelMeter()
+        for block in reader.blocks():
+            pyramid.append(block)
+            level.update(block)
+
+    pyramid.build()
+    mins, maxs = pyramid.levels[0]
+    return {
+        'fs': reader.fs,
+        'channels': reader.channels,
+        'frames': reader.frames_read,
+        'peak': level.peak,
+        'bucket': bucket,
+        'thumbnail': np.stack([mins, maxs]).astype(np.float32).tobytes()
+    }
+
+
+def in_library(path, folders, shallow=()):
+    # Whether scan_audio_files would reach path from these folders.
+    if os.path.dirname(path) in shallow:
+        return True
+    for folder in folders:
+        if not path.startswith(os.path.join(folder, '')):
+            continue
+        subfolder = os.path.dirname(path)
+        while subfolder != folder:
+            if os.path.basename(subfolder).startswith('.') or subfolder in LIBRARY_SKIP_FOLDERS:
+                break
+            subfolder = os.path.dirname(subfolder)
+        else:
+            return True
+    return False
+
+
+class LibraryIndex:
+    # Metadata and waveform thumbnails of every audio file in the library
+    # folders, refreshed only for files whose mtime or size changed.
+    def __init__(self, path=LIBRARY_PATH):
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.connection:
+            self.connection.executescript(LIBRARY_SCHEMA)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def folders(self):
+        with self.lock:
+            return [row[0] for row in self.connection.execute('SELECT path FROM folders ORDER BY path')]
+
+    def add_folder(self, folder):
+        with self.lock, self.connection:
+            self.connection.execute('INSERT OR IGNORE INTO folders VALUES (?)', (os.path.abspath(folder),))
+
+    def scan(self, folders, cancel=None, shallow=()):
+        # Folders in shallow are scanned without their subfolders.
+        folders = [os.path.abspath(folder) for folder in folders]
+        shallow = [os.path.abspath(folder) for folder in shallow]
+        with self.lock:
+            known = {path: (mtime_ns, size) for path, mtime_ns, size in
+                     self.connection.execute('SELECT path, mtime_ns, size FROM files')}
+
+        seen = set()
+        changed = 0
+        for folder, recursive in [(folder, True) for folder in folders] + [(folder, False) for folder in shallow]:
+            for path, mtime_ns, size in scan_audio_files(folder, recursive):
+                if cancel is not None and cancel.is_set():
+                    return changed
+                if path in seen:
+                    continue
+                seen.add(path)
+                if known.get(path) == (mtime_ns, size):
+                    continue
+
+                try:
+                    info = analyse_audio_file(path)
+                except Exception as e:
+                    info = {'error': str(e)}
+                with self.lock, self.connection:
+                    self.connection.execute(
+                        'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        (path, mtime_ns, size, info.get('fs'), info.get('channels'), info.get('frames'),
+                         info.get('peak'), info.get('bucket'), info.get('thumbnail'), info.get('error')))
+                changed += 1
+
+        removed = [(path,) for path in known if path not in seen and in_library(path, folders, shallow)]
+        if removed:
+            with self.lock, self.connection:
+                self.connection.executemany('DELETE FROM files WHERE path = ?', removed)
+        return changed + len(removed)
+
+    def files(self, folders=None, shallow=()):
+        with self.lock:
+            rows = self.connection.execute('SELECT path, fs, channels, frames, peak FROM files '
+                                           'WHERE error IS NULL ORDER BY path').fetchall()
+
+        everything = folders is None and not shallow
+        folders = [os.path.abspath(folder) for folder in folders or []]
+        shallow = [os.path.abspath(folder) for folder in shallow]
+        return [{'path': path, 'fs': fs, 'channels': channels, 'frames': frames, 'duration': frames / fs,
+                 'peak_db': 20 * np.log10(peak) if peak > 0 else -np.inf}
+                for path, fs, channels, frames, peak in rows
+                if everything or in_library(path, folders, shallow)]
+
+    def thumbnail(self, path):
+        with self.lock:
+            row = self.connection.execute('SELECT fs, channels, frames, bucket, thumbnail FROM files '
+                                          'WHERE path = ? AND error IS NULL', (os.path.abspath(path),)).fetchone()
+        if row is None:
+            return None
+
+        fs, channels, frames, bucket, thumbnail = row
+        mins, maxs = np.frombuffer(thumbnail, dtype=np.float32).reshape(2, -1, channels)
+        return WaveformPyramid.from_envelope(mins, maxs, fs, bucket, frames)
+
+
+def params_digest(effect, params):
+    key = json.dumps([effect, sorted(params.items())])
+    return hashlib.sha1(key.encode()).hexdigest()[:8]
+
+
+def unique_output_path(name, used, output_folder):
+    candidate = name
+    index = 2
+    while candidate in used:
+        candidate = f"{name}_{index}"
+        index += 1
+    used.add(candidate)
+    return os.path.join(output_folder, candidate + '.wav')
+
+
+def batch_output_paths(file_paths, effect, params, output_folder):
+    digest = params_digest(effect, params)
+    used = set()
+    output_paths = []
+    for file_path in file_paths:
+        stem = os.path.splitext(os.path.basename(file_path))[0]
+        output_paths.append(unique_output_path(f"{stem}_{effect.lower() or 'clean'}_{digest}", used, output_folder))
+    return output_paths
+
+
+def sweep_output_paths(file_path, effect, combinations, output_folder):
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    used = set()
+    return [unique_output_path(f"{stem}_{effect.lower()}_{params_digest(effect, params)}", used, output_folder)
+            for params in combinations]
+
+
+def batch_job(file_path, effect, params, output_path, block_size=DEFAULT_BLOCK_SIZE, normalize=None,
+              stats_format=None):
+    start_time = time.time()
+    try:
+        stats = process_file(file_path, [(effect, params)], output_path, block_size, normalize=normalize)
+        if stats_format is not None:
+            stats['timings'].write(os.path.splitext(output_path)[0] + '.stats.' + stats_format)
+    except Exception as e:
+        return {'input': file_path, 'output': output_path, 'error': str(e)}
+
+    return {
+        'input': file_path,
+        'output': output_path,
+        'duration': stats['frames'] / stats['fs'],
+        'elapsed_time': stats['elapsed_time'],
+        'total_time': time.time() - start_time,
+        'peak_db': stats['output_level'].peak_db,
+        'rms_db': stats['output_level'].rms_db,
+        'timings': stats['timings'].format()
+    }
+
+
+def expand_inputs(patterns):
+    file_paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        file_paths.extend(path for path in matches if path not in file_paths)
+    return file_paths
+
+
+def parse_params(effect, items):
+    params = {}
+    for item in items:
+        name, sep, value = item.partition('=')
+        if not sep:
+            raise ValueError(f"Parametr musi mieć postać nazwa=wartość: {item}")
+        if name not in EFFECT_PARAM_NAMES.get(effect, []):
+            raise ValueError(f"Efekt {effect} nie ma parametru {name}")
+        params[name] = float(value)
+    return params
+
+
+def run_batch(file_paths, effect, params, output_folder=OUTPUT_FOLDER, workers=None,
+              block_size=DEFAULT_BLOCK_SIZE, normalize=None, stats_format=None):
+    os.makedirs(output_folder, exist_ok=True)
+    output_paths = batch_output_paths(file_paths, effect, params, output_folder)
+
+    results = []
+    start_time = time.time()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(batch_job, file_path, effect, params, output_path, block_size, normalize,
+                                   stats_format)
+                   for file_path, output_path in zip(file_paths, output_paths)]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if 'error' in result:
+                print(f"{result['input']}: BŁĄD {result['error']}")
+            else:
+                print(f"{result['input']} -> {result['output']}: {result['duration']:.1f} s audio, "
+                      f"{result['elapsed_time']:.2f} s DSP, {result['total_time']:.2f} s łącznie, "
+                      f"szczyt {result['peak_db']:.1f} dBFS, RMS {result['rms_db']:.1f} dBFS, "
+                      f"{result['duration'] / max(result['total_time'], 1e-9):.1f}x czasu rzeczywistego")
+                print(f"    etapy: {result['timings']}")
+
+    wall_time = time.time() - start_time
+    done = [result for result in results if 'error' not in result]
+    audio_time = sum(result['duration'] for result in done)
+    print(f"Przetworzono {len(done)}/{len(results)} plików ({audio_time:.1f} s audio) "
+          f"w {wall_time:.2f} s, {audio_time / max(wall_time, 1e-9):.1f}x czasu rzeczywistego")
+    return results
+
+
+def parse_sweep_values(effect, items):
+    values = {}
+    for item in items:
+        name, sep, spec = item.partition('=')
+        if not sep:
+            raise ValueError(f"Parametr musi mieć postać nazwa=wartości: {item}")
+        if name not in EFFECT_PARAM_NAMES.get(effect, []):
+            raise ValueError(f"Efekt {effect} nie ma parametru {name}")
+        if ':' in spec:
+            parts = spec.split(':')
+            if len(parts) > 3:
+                raise ValueError(f"Zakres musi mieć postać min:max[:kroki]: {item}")
+            steps = int(parts[2]) if len(parts) == 3 else SWEEP_STEPS
+            values[name] = (float(parts[0]), float(parts[1]), steps)
+        else:
+            values[name] = list(dict.fromkeys(float(value) for value in spec.split(',')))
+
+    if not values:
+        values = {name: (low, high, SWEEP_STEPS) for name, (low, high) in EFFECT_PARAM_RANGES[effect].items()}
+    return values
+
+
+def sweep_grid(values):
+    axes = [list(dict.fromkeys(np.linspace(*spec).tolist())) if isinstance(spec, tuple) else spec
+            for spec in values.values()]
+    return [dict(zip(values, combination)) for combination in itertools.product(*axes)]
+
+
+def sweep_random(values, count, seed=None):
+    # Only distinct settings are kept, so a small list of values yields fewer
+    # than count combinations instead of rendering the same one twice.
+    if all(isinstance(spec, list) for spec in values.values()):
+        count = min(count, int(np.prod([len(spec) for spec in values.values()])))
+
+    rng = np.random.default_rng(seed)
+    combinations = {}
+    for _ in range(count * SWEEP_RANDOM_ATTEMPTS):
+        if len(combinations) == count:
+            break
+        params = {}
+        for name, spec in values.items():
+            if isinstance(spec, tuple):
+                params[name] = round(float(rng.uniform(spec[0], spec[1])), CACHE_PARAM_DIGITS)
+            else:
+                params[name] = float(rng.choice(spec))
+        combinations.setdefault(tuple(params.values()), params)
+    return list(combinations.values())
+
+
+class SharedAudio:
+    # The decoded input lives in one shared memory block; sweep workers map it
+    # instead of receiving a pickled copy each.
+    def __init__(self, audio):
+        self.shape = audio.shape
+        self.dtype = audio.dtype
+        self.memory = shared_memory.SharedMemory(create=True, size=max(audio.nbytes, 1))
+        np.ndarray(self.shape, self.dtype, buffer=self.memory.buf)[:] = audio
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def spec(self):
+        return self.memory.name, self.shape, self.dtype.str
+
+    def close(self):
+        self.memory.close()
+        self.memory.unlink()
+
+
+sweep_input = None
+
+
+def attach_sweep_input(name, shape, dtype, fs):
+    global sweep_input
+    memory = shared_memory.SharedMemory(name=name)
+    sweep_input = (memory, np.ndarray(shape, np.dtype(dtype), buffer=memory.buf), fs)
+
+
+def sweep_job(effect, params, output_path, block_size=DEFAULT_BLOCK_SIZE):
+    _, audio, fs = sweep_input
+    start_time = time.time()
+    try:
+        renderer = StreamingRenderer(create_processor(effect, params, fs), fs, block_size=block_size)
+        level = renderer.render_to_file(iter_blocks(audio, block_size), output_path, audio.shape[1], len(audio))
+    except Exception as e:
+        return {'params': params, 'output': output_path, 'error': str(e)}
+
+    return {
+        'params': params,
+        'output': output_path,
+        'elapsed_time': time.time() - start_time,
+        'peak_db': level.peak_db,
+        'rms_db': level.rms_db
+    }
+
+
+def write_sweep_table(results, effect, path):
+    names = EFFECT_PARAM_NAMES[effect]
+    with open(path, 'w', newline='') as table_file:
+        writer = csv.writer(table_file)
+        writer.writerow(names + ['peak_db', 'rms_db', 'elapsed_time', 'output', 'error'])
+        for result in results:
+            writer.writerow([result['params'].get(name, '') for name in names] +
+                            [result.get('peak_db', ''), result.get('rms_db', ''), result.get('elapsed_time', ''),
+                             result['output'], result.get('error', '')])
+
+
+def run_sweep(file_path, effect, combinations, output_folder=OUTPUT_FOLDER, workers=None,
+              block_size=DEFAULT_BLOCK_SIZE):
+    os.makedirs(output_folder, exist_ok=True)
+    fs, audio = read_audio(file_path)
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    output_paths = sweep_output_paths(file_path, effect, combinations, output_folder)
+
+    results = [None] * len(combinations)
+    start_time = time.time()
+    with SharedAudio(audio) as shared:
+        with ProcessPoolExecutor(max_workers=workers, initializer=attach_sweep_input,
+                                 initargs=shared.spec() + (fs,)) as executor:
+            futures = {executor.submit(sweep_job, effect, params, output_path, block_size): index
+                       for index, (params, output_path) in enumerate(zip(combinations, output_paths))}
+            for future in as_completed(futures):
+                result = future.result()
+                results[futures[future]] = result
+                settings = ', '.join(f"{name}={value:g}" for name, value in result['params'].items())
+                if 'error' in result:
+                    print(f"{settings}: BŁĄD {result['error']}")
+                else:
+                    print(f"{settings}: szczyt {result['peak_db']:.1f} dBFS, RMS {result['rms_db']:.1f} dBFS, "
+                          f"{result['elapsed_time']:.2f} s -> {result['output']}")
+
+    table_path = os.path.join(output_folder, f"{stem}_{effect.lower()}_sweep.csv")
+    write_sweep_table(results, effect, table_path)
+
+    wall_time = time.time() - start_time
+    done = [result for result in results if 'error' not in result]
+    audio_time = len(done) * len(audio) / fs
+    print(f"Wyrenderowano {len(done)}/{len(results)} ustawień w {wall_time:.2f} s, "
+          f"{audio_time / max(wall_time, 1e-9):.1f}x czasu rzeczywistego, tabela: {table_path}")
+    return results
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Guitar Effects App")
+    subparsers = parser.add_subparsers(dest='command')
+
+    batch_parser = subparsers.add_parser('batch', help="przetwarzanie wielu plików bez interfejsu")
+    batch_parser.add_argument('inputs', nargs='+', help="pliki lub wzorce glob")
+    batch_parser.add_argument('--effect', required=True, choices=list(EFFECT_PARAM_NAMES))
+    batch_parser.add_argument('--param', action='append', default=[], metavar='NAZWA=WARTOŚĆ')
+    batch_parser.add_argument('--output-dir', default=OUTPUT_FOLDER)
+    batch_parser.add_argument('--workers', type=int, default=None)
+    batch_parser.add_argument('--block-size', type=int, default=DEFAULT_BLOCK_SIZE)
+    batch_parser.add_argument('--normalize', choices=NORMALIZE_MODES, default=None)
+    batch_parser.add_argument('--stats', choices=['json', 'csv'], default=None,
+                              help="zapisz czasy etapów i histogram bloków obok każdego pliku wyjściowego")
+
+    sweep_parser = subparsers.add_parser('sweep', help="renderowanie siatki lub losowej próbki ustawień efektu")
+    sweep_parser.add_argument('input', help="plik wejściowy")
+    sweep_parser.add_argument('--effect', required=True, choices=list(EFFECT_PARAM_NAMES))
+    sweep_parser.add_argument('--param', action='append', default=[], metavar='NAZWA=A,B,C|MIN:MAX[:KROKI]')
+    sweep_parser.add_argument('--random', type=int, default=None, metavar='N',
+                              help="losuj N ustawień zamiast pełnej siatki")
+    sweep_parser.add_argument('--seed', type=int, default=None)
+    sweep_parser.add_argument('--output-dir', default=os.path.join(OUTPUT_FOLDER, 'sweep'))
+    sweep_parser.add_argument('--workers', type=int, default=None)
+    sweep_parser.add_argument('--block-size', type=int, default=DEFAULT_BLOCK_SIZE)
+
+    serve_parser = subparsers.add_parser('serve', help="serwer renderowania z kolejką zadań i API HTTP")
+    serve_parser.add_argument('--host', default=SERVER_HOST)
+    serve_parser.add_argument('--port', type=int, default=SERVER_PORT)
+    serve_parser.add_argument('--workers', type=int, default=SERVER_WORKERS)
+    serve_parser.add_argument('--max-queue', type=int, default=SERVER_MAX_QUEUE)
+    serve_parser.add_argument('--keep-jobs', type=int, default=SERVER_KEEP_JOBS,
+                              help="ile zakończonych zadań i ich plików wyjściowych przechowywać")
+    serve_parser.add_argument('--output-dir', default=SERVER_OUTPUT_FOLDER)
+
+    return parser
+
+
+def run_command(parser, args):
+    if args.command == 'batch':
+        try:
+            params = parse_params(args.effect, args.param)
+        except ValueError as e:
+            parser.error(str(e))
+
+        file_paths = expand_inputs(args.inputs)
+        if not file_paths:
+            parser.error("Nie znaleziono plików wejściowych.")
+
+        results = run_batch(file_paths, args.effect, params, args.output_dir, args.workers, args.block_size,
+                            args.normalize, args.stats)
+        return 1 if any('error' in result for result in results) else 0
+
+    if args.command == 'sweep':
+        try:
+            values = parse_sweep_values(args.effect, args.param)
+        except ValueError as e:
+            parser.error(str(e))
+
+        if args.random is not None:
+            combinations = sweep_random(values, args.random, args.seed)
+            if len(combinations) < args.random:
+                print(f"Wylosowano tylko {len(combinations)} różnych ustawień z {args.random}.")
+        else:
+            combinations = sweep_grid(values)
+
+        results = run_sweep(args.input, args.effect, combinations, args.output_dir, args.workers, args.block_size)
+        return 1 if any('error' in result for result in results) else 0
+
+    if args.command == 'serve':
+        from RenderServer import run_server
+
+        return run_server(args.host, args.port, workers=args.workers, output_folder=args.output_dir,
+                          max_queue=args.max_queue, keep_jobs=args.keep_jobs)
+
+    parser.error(f"Nieznane polecenie: {args.command}")
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.error("Podaj polecenie: batch, sweep lub serve.")
+    return run_command(parser, args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
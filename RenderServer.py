@@ -0,0 +1,491 @@
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from GuitarEffectsCore import (DEFAULT_BLOCK_SIZE, EFFECT_PARAM_NAMES, NORMALIZE_MODES, SERVER_HOST,
+                               SERVER_KEEP_JOBS, SERVER_MAX_QUEUE, SERVER_OUTPUT_FOLDER, SERVER_PORT, SERVER_WORKERS, AudioReader,
+                               LevelMeter, RenderCache, RenderCancelled, RenderTimings, StreamingSpectrum,
+                               WaveformPyramid, decode_cached, iter_blocks, read_audio, render_file)
+
+CLIENT_POLL_SECONDS = 0.2
+CLIENT_TIMEOUT = 10
+DOWNLOAD_CHUNK_BYTES = 2 ** 20
+
+
+class RenderServerError(Exception):
+    pass
+
+
+class RenderJob:
+    def __init__(self, job_id, file_path, chain, priority, block_size, normalize, duration):
+        self.id = job_id
+        self.file_path = file_path
+        self.chain = chain
+        self.priority = priority
+        self.block_size = block_size
+        self.normalize = normalize
+        self.duration = duration
+        self.state = 'queued'
+        self.progress = 0.0
+        self.error = None
+        self.result = None
+        self.output_path = None
+        self.cancel = threading.Event()
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+
+    def describe(self, blocks=True):
+        # The per-block times are only sent for a single job; the job list
+        # carries the stage totals.
+        result = self.result
+        if result is not None and not blocks:
+            timings = {name: value for name, value in result['timings'].items()
+                       if name not in ('block_times', 'block_budgets')}
+            result = dict(result, timings=timings)
+        return {
+            'id': self.id,
+            'input': self.file_path,
+            'chain': self.chain,
+            'priority': self.priority,
+            'state': self.state,
+            'progress': self.progress,
+            'duration': self.duration,
+            'error': self.error,
+            'result': result,
+            'submitted': self.submitted,
+            'started': self.started,
+            'finished': self.finished
+        }
+
+
+def parse_chain(request):
+    # A job names either a whole chain or a single effect with its parameters.
+    if 'chain' in request:
+        chain = request['chain']
+    else:
+        chain = [[request.get('effect', ''), request.get('params', {})]]
+
+    if not isinstance(chain, list) or not chain:
+        raise ValueError("Łańcuch efektów musi być niepustą listą.")
+
+    stages = []
+    for stage in chain:
+        if not isinstance(stage, (list, tuple)) or len(stage) != 2 or not isinstance(stage[1], dict):
+            raise ValueError(f"Etap łańcucha musi mieć postać [efekt, parametry]: {stage}")
+        effect, params = stage
+        if effect not in EFFECT_PARAM_NAMES:
+            raise ValueError(f"Nieznany efekt: {effect}")
+        for name in params:
+            if name not in EFFECT_PARAM_NAMES[effect]:
+                raise ValueError(f"Efekt {effect} nie ma parametru {name}")
+        stages.append((effect, {name: float(value) for name, value in params.items()}))
+    return stages
+
+
+class RenderServer:
+    def __init__(self, workers=SERVER_WORKERS, output_folder=SERVER_OUTPUT_FOLDER, max_queue=SERVER_MAX_QUEUE,
+                 cache=None, keep_jobs=SERVER_KEEP_JOBS):
+        self.workers = workers
+        self.output_folder = output_folder
+        self.max_queue = max_queue
+        self.keep_jobs = keep_jobs
+        self.cache = cache if cache is not None else RenderCache()
+        self.jobs = {}
+        self.queue = queue.PriorityQueue()
+        self.sequence = itertools.count()
+        self.job_ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.threads = []
+        self.started = time.time()
+        self.busy_time = 0.0
+        self.wait_time = 0.0
+        self.audio_seconds = 0.0
+        self.started_jobs = 0
+        # Totals outlive the jobs that forget_finished drops.
+        self.finished_counts = {'done': 0, 'failed': 0, 'cancelled': 0}
+
+    def start(self):
+        os.makedirs(self.output_folder, exist_ok=True)
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self.worker, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        with self.lock:
+            for job in self.jobs.values():
+                if job.state == 'queued':
+                    job.state = 'cancelled'
+                    job.finished = time.time()
+                    self.finished_counts['cancelled'] += 1
+                job.cancel.set()
+            self.forget_finished()
+        for _ in self.threads:
+            self.queue.put((float('inf'), next(self.sequence), None))
+        for thread in self.threads:
+            thread.join()
+        self.threads.clear()
+
+    def submit(self, request):
+        chain = parse_chain(request)
+        file_path = request.get('input')
+        if not file_path or not os.path.isfile(file_path):
+            raise ValueError(f"Nie znaleziono pliku wejściowego: {file_path}")
+        normalize = request.get('normalize', 'match_input')
+        if normalize is not None and normalize not in NORMALIZE_MODES:
+            raise ValueError(f"Nieznany tryb normalizacji: {normalize}")
+        priority = int(request.get('priority', 0))
+        block_size = int(request.get('block_size', DEFAULT_BLOCK_SIZE))
+        if block_size <= 0:
+            raise ValueError("Rozmiar bloku musi być dodatni.")
+
+        with AudioReader(file_path) as reader:
+            duration = reader.duration
+
+        with self.lock:
+            if self.queue_depth() >= self.max_queue:
+                raise OverflowError("Kolejka zadań jest pełna.")
+            job_id = f"{next(self.job_ids):06d}"
+            job = RenderJob(job_id, os.path.abspath(file_path), chain, priority, block_size, normalize, duration)
+            self.jobs[job_id] = job
+        # Higher priorities run first, equal ones in submission order.
+        self.queue.put((-priority, next(self.sequence), job))
+        return job
+
+    def cancel(self, job_id):
+        # Returns None when the job is unknown or has already been forgotten.
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if job.state == 'queued':
+                job.state = 'cancelled'
+                job.finished = time.time()
+                self.finished_counts['cancelled'] += 1
+                self.forget_finished()
+        job.cancel.set()
+        return job
+
+    def queue_depth(self):
+        return sum(job.state == 'queued' for job in self.jobs.values())
+
+    def worker(self):
+        while True:
+            _, _, job = self.queue.get()
+            if job is None:
+                return
+            with self.lock:
+                if job.state != 'queued':
+                    continue
+                job.state = 'running'
+                job.started = time.time()
+                self.wait_time += job.started - job.submitted
+                self.started_jobs += 1
+            self.run_job(job)
+
+    def run_job(self, job):
+        output_path = os.path.join(self.output_folder, job.id + '.wav')
+
+        def progress(fraction):
+            job.progress = fraction
+
+        try:
+            result = render_file(job.file_path, job.chain, output_path, job.block_size, progress=progress,
+                                 cancel=job.cancel, normalize=job.normalize, cache=self.cache)
+        except RenderCancelled:
+            state, error, result = 'cancelled', None, None
+        except Exception as e:
+            state, error, result = 'failed', str(e), None
+        else:
+            state, error = 'done', None
+            job.output_path = output_path
+            job.progress = 1.0
+            result = {
+                'elapsed_time': result['elapsed_time'],
+                'cached': result['cached'],
+                'peak_db': result['output_level'].peak_db,
+                'rms_db': result['output_level'].rms_db,
+                'timings': result['timings'].to_dict()
+            }
+
+        with self.lock:
+            job.state, job.error, job.result = state, error, result
+            job.finished = time.time()
+            self.busy_time += job.finished - job.started
+            if state == 'done':
+                self.audio_seconds += job.duration
+            self.finished_counts[state] += 1
+            self.forget_finished()
+
+    def forget_finished(self):
+        # Called with the lock held. Only the newest keep_jobs finished jobs
+        # are kept, older ones are dropped together with their output files.
+        finished = sorted((job for job in self.jobs.values() if job.finished is not None),
+                          key=lambda job: job.finished)
+        for job in finished[:max(len(finished) - self.keep_jobs, 0)]:
+            del self.jobs[job.id]
+            if job.output_path is not None:
+                try:
+                    os.remove(job.output_path)
+                except FileNotFoundError:
+                    pass
+
+    def metrics(self):
+        with self.lock:
+            states = [job.state for job in self.jobs.values()]
+            uptime = time.time() - self.started
+            done = self.finished_counts['done']
+            return {
+                'uptime': uptime,
+                'workers': self.workers,
+                'queue_depth': states.count('queued'),
+                'running': states.count('running'),
+                'done': done,
+                'failed': self.finished_counts['failed'],
+                'cancelled': self.finished_counts['cancelled'],
+                'kept_jobs': len(self.jobs),
+                'jobs_per_minute': done / max(uptime, 1e-9) * 60,
+                'audio_seconds': self.audio_seconds,
+                'realtime_factor': self.audio_seconds / max(self.busy_time, 1e-9),
+                'mean_wait': self.wait_time / max(self.started_jobs, 1),
+                'utilisation': self.busy_time / max(uptime * self.workers, 1e-9)
+            }
+
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    # POST /jobs, GET /jobs, GET /jobs/<id>, GET /jobs/<id>/output,
+    # POST /jobs/<id>/cancel (or DELETE /jobs/<id>) and GET /metrics.
+    def send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_not_found(self):
+        self.send_json(404, {'error': f"Nieznana ścieżka: {self.path}"})
+
+    def send_cancelled(self, job, job_id):
+        # The job may have been forgotten since route() found it.
+        if job is None:
+            self.send_json(404, {'error': f"Nie ma zadania {job_id}"})
+        else:
+            self.send_json(200, job.describe())
+
+    def route(self):
+        # Returns the path segments and the job they name, if any; unknown
+        # jobs are answered here and come back as (None, None).
+        parts = [part for part in self.path.split('?')[0].split('/') if part]
+        job = None
+        if len(parts) >= 2 and parts[0] == 'jobs':
+            job = self.server.render_server.jobs.get(parts[1])
+            if job is None:
+                self.send_json(404, {'error': f"Nie ma zadania {parts[1]}"})
+                return None, None
+        return parts, job
+
+    def do_GET(self):
+        render_server = self.server.render_server
+        parts, job = self.route()
+        if parts is None:
+            return
+        if parts == ['metrics']:
+            self.send_json(200, render_server.metrics())
+        elif parts == ['jobs']:
+            self.send_json(200, [job.describe(blocks=False) for job in list(render_server.jobs.values())])
+        elif job is not None and len(parts) == 2:
+            self.send_json(200, job.describe())
+        elif job is not None and parts[2:] == ['output']:
+            if job.output_path is None:
+                self.send_json(409, {'error': "Zadanie nie zostało jeszcze ukończone."})
+                return
+            # The file goes away when the job is forgotten; once open it can
+            # still be sent in full.
+            try:
+                f = open(job.output_path, 'rb')
+            except FileNotFoundError:
+                self.send_json(404, {'error': f"Nie ma zadania {job.id}"})
+                return
+            with f:
+                self.send_response(200)
+                self.send_header('Content-Type', 'audio/wav')
+                self.send_header('Content-Length', str(os.fstat(f.fileno()).st_size))
+                self.end_headers()
+                for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_BYTES), b''):
+                    self.wfile.write(chunk)
+        else:
+            self.send_not_found()
+
+    def do_POST(self):
+        render_server = self.server.render_server
+        parts, job = self.route()
+        if parts is None:
+            return
+        if parts == ['jobs']:
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                job = render_server.submit(json.loads(self.rfile.read(length) or b'{}'))
+            except OverflowError as e:
+                self.send_json(503, {'error': str(e)})
+            except Exception as e:
+                self.send_json(400, {'error': str(e)})
+            else:
+                self.send_json(201, job.describe())
+        elif job is not None and parts[2:] == ['cancel']:
+            self.send_cancelled(render_server.cancel(job.id), job.id)
+        else:
+            self.send_not_found()
+
+    def do_DELETE(self):
+        parts, job = self.route()
+        if parts is None:
+            return
+        if job is not None and len(parts) == 2:
+            self.send_cancelled(self.server.render_server.cancel(job.id), job.id)
+        else:
+            self.send_not_found()
+
+
+def create_server(host=SERVER_HOST, port=SERVER_PORT, **kwargs):
+    render_server = RenderServer(**kwargs)
+    http_server = ThreadingHTTPServer((host, port), RenderRequestHandler)
+    http_server.daemon_threads = True
+    http_server.render_server = render_server
+    render_server.start()
+    return http_server
+
+
+def run_server(host=SERVER_HOST, port=SERVER_PORT, **kwargs):
+    http_server = create_server(host, port, **kwargs)
+    print(f"Serwer renderowania nasłuchuje na http://{host}:{http_server.server_address[1]}")
+    try:
+        http_server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        http_server.server_close()
+        http_server.render_server.stop()
+    return 0
+
+
+class RenderClient:
+    def __init__(self, url, timeout=CLIENT_TIMEOUT):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def request(self, method, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.url + path, data=data, method=method,
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read())['error']
+            except (ValueError, KeyError):
+                message = str(e)
+            raise RenderServerError(message) from e
+        except urllib.error.URLError as e:
+            raise RenderServerError(f"Brak połączenia z serwerem {self.url}: {e.reason}") from e
+
+    def submit(self, file_path, chain, priority=0, block_size=DEFAULT_BLOCK_SIZE, normalize="match_input"):
+        return self.request('POST', '/jobs', {
+            'input': os.path.abspath(file_path),
+            'chain': [[effect, params] for effect, params in chain],
+            'priority': priority,
+            'block_size': block_size,
+            'normalize': normalize
+        })
+
+    def status(self, job_id):
+        return self.request('GET', f'/jobs/{job_id}')
+
+    def jobs(self):
+        return self.request('GET', '/jobs')
+
+    def cancel(self, job_id):
+        return self.request('POST', f'/jobs/{job_id}/cancel')
+
+    def metrics(self):
+        return self.request('GET', '/metrics')
+
+    def download(self, job_id, output_path):
+        try:
+            with urllib.request.urlopen(f'{self.url}/jobs/{job_id}/output', timeout=self.timeout) as response, \
+                    open(output_path, 'wb') as f:
+                for chunk in iter(lambda: response.read(DOWNLOAD_CHUNK_BYTES), b''):
+                    f.write(chunk)
+        except urllib.error.URLError as e:
+            raise RenderServerError(f"Nie udało się pobrać wyniku zadania {job_id}: {e}") from e
+
+    def wait(self, job_id, progress=None, cancel=None):
+        while True:
+            job = self.status(job_id)
+            if progress is not None:
+                progress(job['progress'])
+            if job['state'] in ('done', 'failed', 'cancelled'):
+                return job
+            if cancel is not None and cancel.is_set():
+                self.cancel(job_id)
+            time.sleep(CLIENT_POLL_SECONDS)
+
+    def render_file(self, file_path, chain, output_path, block_size=DEFAULT_BLOCK_SIZE, progress=None, cancel=None,
+                    normalize="match_input", cache=None, priority=0):
+        # Same result as GuitarEffectsCore.render_file, so the GUI can plot
+        # and play a remote render exactly like a local one.
+        start_time = time.time()
+        job = self.submit(file_path, chain, priority, block_size, normalize)
+        job = self.wait(job['id'], progress, cancel)
+        if job['state'] == 'cancelled':
+            raise RenderCancelled()
+        if job['state'] == 'failed':
+            raise RenderServerError(job['error'])
+
+        timings = RenderTimings.from_dict(job['result']['timings'])
+        timings.add('queue', job['started'] - job['submitted'])
+        with timings.measure('download'):
+            self.download(job['id'], output_path)
+
+        with timings.measure('decode'):
+            if cache is not None:
+                fs, audio = decode_cached(file_path, cache)
+            else:
+                fs, audio = read_audio(file_path)
+            output_fs, output = read_audio(output_path)
+
+        with timings.measure('analysis'):
+            spectrum_original = StreamingSpectrum(fs, len(audio))
+            spectrum_processed = StreamingSpectrum(output_fs, len(output))
+            for block in iter_blocks(audio, block_size):
+                spectrum_original.append(block)
+            for block in iter_blocks(output, block_size):
+                spectrum_processed.append(block)
+            pyramid_original = WaveformPyramid.from_signal(audio, fs)
+            pyramid_processed = WaveformPyramid.from_signal(output, output_fs)
+            output_level = LevelMeter()
+            output_level.update(output)
+
+        return {
+            'fs': output_fs,
+            'audio': output,
+            'pyramid_original': pyramid_original,
+            'pyramid_processed': pyramid_processed,
+            'spectrum_original': spectrum_original,
+            'spectrum_processed': spectrum_processed,
+            'output_level': output_level,
+            'output_path': output_path,
+            'elapsed_time': time.time() - start_time,
+            'cached': job['result']['cached'],
+            'first_stage': 0,
+            'timings': timings,
+            'job': job['id']
+        }
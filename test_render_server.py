@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import numpy as np
+import soundfile as sf
+
+from GuitarEffectsCore import RenderCache
+from RenderServer import RenderServer
+
+CONCURRENT_WORKERS = 4
+CONCURRENT_JOBS = 4
+CONCURRENT_TRIALS = 5
+JOB_TIMEOUT = 30
+
+
+def wait_for(jobs):
+    deadline = time.time() + JOB_TIMEOUT
+    while any(job.finished is None for job in jobs) and time.time() < deadline:
+        time.sleep(0.01)
+
+
+class ConcurrentJobsTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.input_path = os.path.join(self.folder, 'input.wav')
+        signal = np.random.default_rng(0).uniform(-0.5, 0.5, (44100, 2)).astype(np.float32)
+        sf.write(self.input_path, signal, 44100)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_identical_jobs_share_the_disk_cache(self):
+        # Identical jobs store the same cache keys at the same time.
+        for trial in range(CONCURRENT_TRIALS):
+            cache = RenderCache(folder=os.path.join(self.folder, f'cache{trial}'))
+            server = RenderServer(CONCURRENT_WORKERS, os.path.join(self.folder, f'output{trial}'), cache=cache)
+            server.start()
+            try:
+                jobs = [server.submit({'input': self.input_path, 'effect': 'Delay',
+                                       'params': {'delay_time': 0.1, 'decay': 0.5}})
+                        for _ in range(CONCURRENT_JOBS)]
+                wait_for(jobs)
+            finally:
+                server.stop()
+
+            for job in jobs:
+                self.assertEqual(job.state, 'done', job.error)
+            self.assertFalse([name for name in os.listdir(cache.folder) if name.endswith('.tmp')])
+
+    def test_old_finished_jobs_are_forgotten(self):
+        output_folder = os.path.join(self.folder, 'output')
+        server = RenderServer(1, output_folder, cache=RenderCache(folder=None), keep_jobs=2)
+        server.start()
+        try:
+            jobs = [server.submit({'input': self.input_path, 'effect': 'Delay',
+                                   'params': {'delay_time': 0.1 * (index + 1), 'decay': 0.5}})
+                    for index in range(5)]
+            wait_for(jobs)
+        finally:
+            server.stop()
+
+        self.assertEqual(sorted(server.jobs), [job.id for job in jobs[-2:]])
+        self.assertEqual(sorted(os.listdir(output_folder)), [job.id + '.wav' for job in jobs[-2:]])
+        self.assertEqual(server.metrics()['done'], 5)
+        self.assertNotIn('block_times', jobs[-1].describe(blocks=False)['result']['timings'])
+        self.assertIn('block_times', jobs[-1].describe()['result']['timings'])
+
+    def test_stop_cancels_queued_jobs(self):
+        server = RenderServer(1, os.path.join(self.folder, 'output'), cache=RenderCache(folder=None), keep_jobs=2)
+        jobs = [server.submit({'input': self.input_path, 'effect': 'Delay'}) for _ in range(3)]
+        server.stop()
+
+        self.assertEqual([job.state for job in jobs], ['cancelled'] * 3)
+        self.assertEqual(server.metrics()['cancelled'], 3)
+        self.assertEqual(server.metrics()['kept_jobs'], 2)
+        self.assertIsNone(server.cancel(jobs[0].id))
+
+
+if __name__ == '__main__':
+    unittest.main()